@@ -3,97 +3,245 @@ Utility functions for tracking and calculating API costs
 """
 
 import time
+import datetime
+import logging
+import threading
+from collections import OrderedDict, deque
 from dataclasses import dataclass
-from typing import List, Dict, Optional
+from typing import Dict, Optional
 
-# Current Gemini API pricing (as of 2024)
-PRICING = {
-    "gemini-2.0-flash": {
-        "input": 0.000003,  # $0.000003 per 1K input tokens
-        "output": 0.000006  # $0.000006 per 1K output tokens
-    },
-    "gemini-2.0-pro": {
-        "input": 0.000012,  # $0.000012 per 1K input tokens
-        "output": 0.000024  # $0.000024 per 1K output tokens
+import numpy as np
+
+logger = logging.getLogger('transcriber')
+
+# Gemini API price tables, per 1K tokens, keyed by version so historical calls can be
+# re-priced under any table. Add a new version instead of editing an old one.
+PRICE_TABLES = {
+    "2024-01": {
+        "gemini-2.0-flash": {
+            "input": 0.000003,  # $0.000003 per 1K input tokens
+            "output": 0.000006  # $0.000006 per 1K output tokens
+        },
+        "gemini-2.0-pro": {
+            "input": 0.000012,  # $0.000012 per 1K input tokens
+            "output": 0.000024  # $0.000024 per 1K output tokens
+        }
     }
 }
 
+CURRENT_PRICE_VERSION = "2024-01"
+
+# Current Gemini API pricing
+PRICING = PRICE_TABLES[CURRENT_PRICE_VERSION]
+
 # Default model to use for pricing calculations
 DEFAULT_MODEL = "gemini-2.0-flash"
 
-@dataclass
+def get_model_pricing(model: str, price_version: Optional[str] = None) -> Dict[str, float]:
+    """Return the per-1K token prices of a model, falling back to the default model"""
+    table = PRICE_TABLES[price_version or CURRENT_PRICE_VERSION]
+    return table.get(model, table[DEFAULT_MODEL])
+
+def calculate_cost(model: str, input_tokens: int, output_tokens: int,
+                   price_version: Optional[str] = None) -> float:
+    """Calculate the cost of a request from its token counts"""
+    model_pricing = get_model_pricing(model, price_version)
+    input_cost = (input_tokens / 1000) * model_pricing["input"]
+    output_cost = (output_tokens / 1000) * model_pricing["output"]
+    return input_cost + output_cost
+
+def calculate_costs(models, input_tokens, output_tokens,
+                    price_version: Optional[str] = None) -> np.ndarray:
+    """
+    Price many requests at once from column arrays.
+
+    Prices are looked up once per distinct model and broadcast back over the rows,
+    so re-pricing millions of historical calls is a handful of array operations.
+    """
+    models = np.asarray(models, dtype=object).astype(str)
+    if models.size == 0:
+        return np.zeros(0)
+    unique_models, inverse = np.unique(models, return_inverse=True)
+    pricing = [get_model_pricing(model, price_version) for model in unique_models]
+    input_prices = np.array([p["input"] for p in pricing]) / 1000
+    output_prices = np.array([p["output"] for p in pricing]) / 1000
+    return (np.asarray(input_tokens, dtype=np.float64) * input_prices[inverse]
+            + np.asarray(output_tokens, dtype=np.float64) * output_prices[inverse])
+
+@dataclass(slots=True)
 class ApiRequest:
     """Represents a single API request"""
-    request_type: str  # 'transcription', 'summary', or 'qa'
+    request_type: str  # 'transcription', 'summary', 'qa' or 'embedding'
     model: str
     input_tokens: int
     output_tokens: int
     timestamp: float
+    cost: float = 0.0
     
     @property
     def total_tokens(self):
         return self.input_tokens + self.output_tokens
     
-    @property
-    def cost(self):
-        model_pricing = PRICING.get(self.model, PRICING[DEFAULT_MODEL])
-        input_cost = (self.input_tokens / 1000) * model_pricing["input"]
-        output_cost = (self.output_tokens / 1000) * model_pricing["output"]
-        return input_cost + output_cost
+    def to_dict(self) -> Dict:
+        return {
+            "type": self.request_type,
+            "request_type": self.request_type,
+            "model": self.model,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "total_tokens": self.total_tokens,
+            "cost": self.cost,
+            "timestamp": self.timestamp
+        }
 
 class ApiCostTracker:
-    """Track API costs for a session"""
+    """Track API costs for a session, keeping running totals as requests are added"""
     
-    def __init__(self):
-        self.requests: List[ApiRequest] = []
+    __slots__ = ("price_version", "requests", "total_tokens", "total_cost", "request_counts")
+    
+    def __init__(self, price_version: Optional[str] = None, max_requests: Optional[int] = None):
+        self.price_version = price_version or CURRENT_PRICE_VERSION
+        # Only the latest max_requests are itemised; totals cover every request
+        self.requests = deque(maxlen=max_requests)
+        self.total_tokens = 0
+        self.total_cost = 0.0
+        self.request_counts: Dict[str, int] = {}
     
     def add_request(self, request_type: str, model: str, 
-                   input_tokens: int, output_tokens: int) -> float:
-        """Add a request to the tracker and return its cost"""
+                   input_tokens: int, output_tokens: int) -> ApiRequest:
+        """Add a request to the tracker and return it"""
         request = ApiRequest(
             request_type=request_type,
             model=model,
             input_tokens=input_tokens,
             output_tokens=output_tokens,
-            timestamp=time.time()
+            timestamp=time.time(),
+            cost=calculate_cost(model, input_tokens, output_tokens, self.price_version)
         )
         self.requests.append(request)
-        return request.cost
-    
-    @property
-    def total_tokens(self) -> int:
-        """Get the total number of tokens used"""
-        return sum(req.total_tokens for req in self.requests)
-    
-    @property
-    def total_cost(self) -> float:
-        """Get the total cost of all requests"""
-        return sum(req.cost for req in self.requests)
+        self.total_tokens += request.total_tokens
+        self.total_cost += request.cost
+        self.request_counts[request_type] = self.request_counts.get(request_type, 0) + 1
+        return request
     
     def get_request_count_by_type(self) -> Dict[str, int]:
         """Get count of requests by type"""
-        counts = {}
-        for req in self.requests:
-            counts[req.request_type] = counts.get(req.request_type, 0) + 1
-        return counts
+        return dict(self.request_counts)
     
     def get_summary(self) -> Dict:
         """Get a complete summary of usage and costs"""
-        request_summary = []
-        for req in self.requests:
-            request_summary.append({
-                "type": req.request_type,
-                "model": req.model,
-                "input_tokens": req.input_tokens,
-                "output_tokens": req.output_tokens,
-                "total_tokens": req.total_tokens,
-                "cost": req.cost,
-                "timestamp": req.timestamp
-            })
-        
         return {
             "total_tokens": self.total_tokens,
             "total_cost": self.total_cost,
-            "requests": request_summary,
+            "price_version": self.price_version,
+            "requests": [req.to_dict() for req in self.requests],
             "request_counts": self.get_request_count_by_type()
         }
+
+class SessionCostStore:
+    """
+    Bounded per-session cost trackers.
+
+    Trackers are kept in memory with LRU and idle-TTL eviction, and each tracker only
+    itemises its latest requests. When a collection is given every request is also
+    written through to MongoDB, so summaries can be read from any worker and survive
+    eviction.
+    """
+    
+    def __init__(self, collection=None, max_sessions: int = 1000, ttl_seconds: float = 3600,
+                 max_requests: int = 100):
+        self.collection = collection
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_requests = max_requests
+        # session_id -> (tracker, last access time), least recently used first
+        self.trackers = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def _evict(self, now: float):
+        while self.trackers:
+            _, last_access = next(iter(self.trackers.values()))
+            if len(self.trackers) <= self.max_sessions and now - last_access < self.ttl_seconds:
+                break
+            self.trackers.popitem(last=False)
+    
+    def start(self, session_id: str) -> ApiCostTracker:
+        """Create (or reset) the tracker of a session and return it"""
+        tracker = ApiCostTracker(max_requests=self.max_requests)
+        now = time.monotonic()
+        with self.lock:
+            self.trackers[session_id] = (tracker, now)
+            self.trackers.move_to_end(session_id)
+            self._evict(now)
+        
+        if self.collection is not None:
+            self._write_start(session_id, tracker)
+        return tracker
+    
+    def _write_start(self, session_id: str, tracker: ApiCostTracker):
+        # A session that is never charged (e.g. a cached transcript) still reports zero totals
+        try:
+            self.collection.update_one(
+                {'_id': session_id},
+                {
+                    '$setOnInsert': {'total_tokens': 0, 'total_cost': 0.0, 'request_counts': {}, 'requests': []},
+                    '$set': {'price_version': tracker.price_version, 'updated_at': datetime.datetime.utcnow()}
+                },
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"Failed to write session cost for {session_id}: {str(e)}")
+    
+    def get_tracker(self, session_id: str) -> Optional[ApiCostTracker]:
+        """Return this process's tracker for a session, or None if it was evicted"""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.trackers.get(session_id)
+            if entry is None or now - entry[1] >= self.ttl_seconds:
+                return None
+            self.trackers[session_id] = (entry[0], now)
+            self.trackers.move_to_end(session_id)
+            return entry[0]
+    
+    def add_request(self, session_id: str, request_type: str, model: str,
+                    input_tokens: int, output_tokens: int) -> float:
+        """Charge a request to a session and return its cost"""
+        tracker = self.get_tracker(session_id) or self.start(session_id)
+        with self.lock:
+            request = tracker.add_request(request_type, model, input_tokens, output_tokens)
+        
+        if self.collection is not None:
+            self._write_through(session_id, tracker, request)
+        return request.cost
+    
+    def _write_through(self, session_id: str, tracker: ApiCostTracker, request: ApiRequest):
+        try:
+            self.collection.update_one(
+                {'_id': session_id},
+                {
+                    '$inc': {
+                        'total_tokens': request.total_tokens,
+                        'total_cost': request.cost,
+                        f'request_counts.{request.request_type}': 1
+                    },
+                    '$push': {'requests': {'$each': [request.to_dict()], '$slice': -self.max_requests}},
+                    '$set': {'price_version': tracker.price_version, 'updated_at': datetime.datetime.utcnow()}
+                },
+                upsert=True
+            )
+        except Exception as e:
+            # Cost accounting must never fail the request being charged
+            logger.error(f"Failed to write session cost for {session_id}: {str(e)}")
+    
+    def get_summary(self, session_id: str) -> Optional[Dict]:
+        """Return a session's cost summary, or None if the session is unknown"""
+        if self.collection is not None:
+            summary = self.collection.find_one({'_id': session_id}, {'_id': 0, 'updated_at': 0})
+            if summary is not None:
+                return summary
+        # Not written through (no collection, or the write failed): use this process's tracker
+        tracker = self.get_tracker(session_id)
+        if tracker is None:
+            return None
+        with self.lock:
+            return tracker.get_summary()
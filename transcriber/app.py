@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory, session, redirect, url_for, flash
+from flask import Flask, render_template, request, jsonify, send_from_directory, session, redirect, url_for, flash, Response, stream_with_context
 import os
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
@@ -6,35 +6,52 @@ import uuid
 from google import genai
 from google.genai import types
 import shutil
+import subprocess
 import sys
 import traceback
 import logging
 import json
 import re
 import time
+import itertools
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from functools import wraps
 import hashlib
 from pathlib  import Path 
 import user_auth
-from pymongo import MongoClient    # (if not already imported)
+import jobs
+import rate_limit
+import stitching
+import transcript_store
+import telemetry
+import audio_cache
+import usage_rollups
+import api_cost
+import transcript_cache
+import retrieval
+import summarizer
+import response_cache
 import datetime
 
 # Try to import required packages with informative errors
 try:
-    from moviepy.editor import VideoFileClip
+    import segmenter
 except ImportError:
-    print("ERROR: MoviePy not installed properly. Please run: pip install moviepy")
-
-try:
-    from pydub import AudioSegment
-    from pydub.silence import split_on_silence
-except ImportError:
-    print("ERROR: PyDub not installed. Please run: pip install pydub")
+    print("ERROR: NumPy not installed. Please run: pip install numpy")
 
 print('starting app.py')
 TRANSCRIPTION_MODEL = "gemini-2.0-flash"  # Updated model name
 QnA_MODEL = "gemini-2.0-flash"  # Updated model name
 SUMMARY_MODEL = "gemini-2.0-flash"  # Updated model name
+EMBEDDING_MODEL = "text-embedding-004"
+# Transcript chunks sent with each question; shorter transcripts are sent whole
+RETRIEVAL_TOP_K = int(os.environ.get('RETRIEVAL_TOP_K', 6))
+# Texts per embedding request
+EMBED_BATCH_SIZE = 100
+# Bump when the transcription prompts change so cached transcripts are not reused
+TRANSCRIPTION_PROMPT_VERSION = "v1"
+# Number of audio segments transcribed concurrently (still bounded by RATE_LIMITS)
+TRANSCRIPTION_WORKERS = int(os.environ.get('TRANSCRIPTION_WORKERS', 4))
 
 
 # Setup logging
@@ -86,50 +103,51 @@ except Exception as e:
 
 # Supported audio formats
 ALLOWED_AUDIO_EXTENSIONS = {'mp3', 'm4a', 'wav'}
+# Uploads in these formats are already compact enough to be played back as they are;
+# anything else is encoded once into segmenter.PLAYBACK_EXTENSION at ingest
+PLAYBACK_PASSTHROUGH_EXTENSIONS = {'mp3', 'm4a'}
+# Browser cache lifetime of playback audio (seconds)
+AUDIO_CACHE_MAX_AGE = 365 * 24 * 3600
 
 # Ensure upload and cache folders exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['AUDIO_CACHE'], exist_ok=True)
 
-# API cost settings
-API_COSTS = {
-    "transcription": 0.00001,  # $0.00001 per token for audio transcription
-    "text": 0.000005,  # $0.000005 per token for text generation
-}
+# Keeps the audio cache under its byte quota (AUDIO_CACHE_MAX_BYTES), evicting least recently played files
+audio_cache_manager = audio_cache.create_cache_manager(app.config['AUDIO_CACHE'])
+audio_cache_manager.start()
 
-class CostTracker:
-    def __init__(self):
-        self.total_tokens = 0
-        self.total_cost = 0
-        self.request_breakdown = []
-        
-    def add_request(self, request_type, tokens, model_name):
-        """Add a request to the cost tracker"""
-        cost_per_token = API_COSTS.get(request_type, 0.000005)
-        cost = tokens * cost_per_token
-        
-        self.total_tokens += tokens
-        self.total_cost += cost
-        
-        self.request_breakdown.append({
-            "request_type": request_type,
-            "model": model_name,
-            "tokens": tokens,
-            "cost": cost
-        })
-        
-        return cost
-    
-    def get_summary(self):
-        """Get a summary of costs"""
-        return {
-            "total_tokens": self.total_tokens,
-            "total_cost": self.total_cost,
-            "requests": self.request_breakdown
-        }
+# Background workers that run the transcription pipeline outside the request
+job_queue = jobs.create_job_queue()
 
-# Track costs by session
-session_costs = {}
+# Transcripts are looked up server-side by id; the session only keeps the ids
+stored_transcripts = transcript_store.TranscriptStore(user_auth.transcripts_collection, user_auth.transcript_digest)
+# Number of recent transcript ids remembered in the session
+SESSION_TRANSCRIPT_IDS = 20
+
+# Summaries and answers are reused for identical requests (bypass with "bypassCache": true)
+cached_responses = response_cache.ResponseCache(
+    user_auth.db.response_cache,
+    max_entries=int(os.environ.get('RESPONSE_CACHE_ENTRIES', 256))
+)
+# Bump when the question prompt or retrieval settings change so cached answers are not reused
+QA_PROMPT_VERSION = "v1"
+
+# Track costs by session; bounded in memory and shared between workers through MongoDB
+session_costs = api_cost.SessionCostStore(
+    user_auth.db.session_costs,
+    max_sessions=int(os.environ.get('SESSION_COST_MAX_SESSIONS', 1000)),
+    ttl_seconds=int(os.environ.get('SESSION_COST_TTL_SECONDS', 3600))
+)
+
+
+def charge_session(session_id, request_type, model, token_usage):
+    """Add a request's token usage to the session's cost tracker"""
+    if not session_id:
+        return
+    session_costs.add_request(
+        session_id, request_type, model,
+        token_usage.get("prompt_tokens") or 0, token_usage.get("response_tokens") or 0)
 
 
 def get_token_from_response(response):
@@ -163,234 +181,225 @@ def get_mime_type(file_extension):
         'mp3': 'audio/mpeg',
         'm4a': 'audio/m4a',
         'wav': 'audio/wav',
+        'ogg': 'audio/ogg',
+        'flac': 'audio/flac',
     }
     return mime_types.get(file_extension.lower(), 'audio/wav')
 
+# Long recordings are cut into many short, overlapping segments that are transcribed in
+# parallel and stitched back together (see stitching.py)
+TARGET_SEGMENT_SECONDS = 180
+MAX_SEGMENTS = 60
+SEGMENT_OVERLAP_SECONDS = 5
+
 def segment_audio(audio_path):
     """Split audio into segments based on silence."""
-    # Convert to WAV for processing if not already WAV
-    file_ext = os.path.splitext(audio_path)[1][1:].lower()
-    
-    if file_ext != 'wav':
-        print(f"Converting {file_ext} to WAV for processing")
-        try:
-            audio = AudioSegment.from_file(audio_path, format=file_ext)
-            temp_wav_path = os.path.join(app.config['UPLOAD_FOLDER'], 'temp_processing.wav')
-            audio.export(temp_wav_path, format="wav")
-            audio_path = temp_wav_path
-        except Exception as e:
-            print(f"Error converting to WAV: {str(e)}")
-            return [audio_path]  # Return original if conversion fails
-    else:
-        audio = AudioSegment.from_file(audio_path)
-    
-    # Get audio duration in seconds
-    duration_seconds = len(audio) / 1000
-    
-    # For shorter audio files (less than 5 minutes), don't segment
-    if duration_seconds < 300:
-        logger.info(f"Audio file is short ({duration_seconds:.1f}s), processing as a single segment")
-        return [audio_path]
-    
-    # Split on silence with adjusted parameters to create fewer segments
+    # Decoding is streamed through ffmpeg, so no intermediate WAV or in-memory waveform is needed
     try:
-        chunks = split_on_silence(
-            audio, 
-            # Increase minimum silence length (from 1000ms to 2000ms)
-            min_silence_len=3000,  # 2 seconds of silence required
-            # Lower threshold (more negative = stricter silence detection)
-            silence_thresh=-45,     # -45 dBFS (was -40)
-            # Keep more silence to maintain context
-            keep_silence=500        # 500ms of silence at the start/end (was 300)
+        return segmenter.split_audio_file(
+            audio_path,
+            app.config['UPLOAD_FOLDER'],
+            min_segment_seconds=300,  # Don't segment files shorter than 5 minutes
+            max_segments=MAX_SEGMENTS,
+            min_silence_len=3000,     # 3 seconds of silence required
+            silence_thresh=-45,       # -45 dBFS
+            target_segment_seconds=TARGET_SEGMENT_SECONDS,
+            overlap_seconds=SEGMENT_OVERLAP_SECONDS
         )
-        
-        # If we still have too many segments, combine segments to limit their number
-        max_segments = 10  # Maximum desired segments
-        
-        if len(chunks) > max_segments:
-            logger.info(f"Too many segments ({len(chunks)}), combining to {max_segments} segments")
-            # Calculate how many original segments to combine into each new segment
-            segments_per_group = len(chunks) // max_segments + 1
-            combined_chunks = []
-            
-            for i in range(0, len(chunks), segments_per_group):
-                # Combine a group of segments
-                group = chunks[i:i + segments_per_group]
-                if group:
-                    combined = group[0]
-                    for chunk in group[1:]:
-                        combined += chunk
-                    combined_chunks.append(combined)
-            
-            chunks = combined_chunks
     except Exception as e:
         print(f"Error splitting audio: {str(e)}")
-        return [audio_path]
-    
-    logger.info(f"Audio split into {len(chunks)} segments")
-    
-    # If no segments were found or just one, use the original file
-    if not chunks or len(chunks) < 2:
-        return [audio_path]
-    
-    # Save each chunk as a separate audio file
-    segment_files = []
-    for i, chunk in enumerate(chunks):
-        segment_filename = f"segment_{i}_{uuid.uuid4().hex[:6]}.wav"
-        segment_path = os.path.join(app.config['UPLOAD_FOLDER'], segment_filename)
-        chunk.export(segment_path, format="wav")
-        segment_files.append(segment_path)
-    
-    return segment_files
+        return [audio_path]  # Return original if segmentation fails
 
 # API rate limiting settings
 RATE_LIMITS = {
     "gemini-2.0-flash": {
-        "requests_per_minute": 10,  # Set slightly below the actual limit of 15
-        "cooldown_period": 60,      # Seconds to wait when hitting a rate limit
+        "requests_per_minute": 10,       # Set slightly below the actual limit of 15
+        "tokens_per_minute": 900_000,    # Set slightly below the actual limit of 1M
+    },
+    EMBEDDING_MODEL: {
+        "requests_per_minute": 100,
     }
 }
 
-class RateLimiter:
-    def __init__(self):
-        self.last_request_time = {}  # Model -> list of timestamps
-        self.in_cooldown = {}        # Model -> cooldown end time
-        
-    def check_rate_limit(self, model):
-        """Check if we're within rate limits for the model."""
-        current_time = time.time()
-        
-        # Check if we're in cooldown
-        if model in self.in_cooldown and current_time < self.in_cooldown[model]:
-            remaining_wait = int(self.in_cooldown[model] - current_time)
-            return False, f"Rate limit cooldown: {remaining_wait}s remaining"
-        
-        # Initialize timestamp list if needed
-        if model not in self.last_request_time:
-            self.last_request_time[model] = []
-        
-        # Remove timestamps older than 60 seconds
-        self.last_request_time[model] = [
-            t for t in self.last_request_time[model] 
-            if current_time - t < 60
-        ]
-        
-        # Check if we've hit the rate limit
-        model_limits = RATE_LIMITS.get(model, {"requests_per_minute": 10})
-        if len(self.last_request_time[model]) >= model_limits["requests_per_minute"]:
-            # Enter cooldown mode
-            cooldown_seconds = model_limits.get("cooldown_period", 60)
-            self.in_cooldown[model] = current_time + cooldown_seconds
-            return False, f"Rate limit reached: cooling down for {cooldown_seconds}s"
-        
-        return True, ""
-    
-    def record_request(self, model):
-        """Record a request for the model."""
-        if model not in self.last_request_time:
-            self.last_request_time[model] = []
-        self.last_request_time[model].append(time.time())
-    
-    def get_status(self, model):
-        """Get current rate limit status."""
-        current_time = time.time()
-        
-        # Check if we're in cooldown
-        if model in self.in_cooldown and current_time < self.in_cooldown[model]:
-            remaining_wait = int(self.in_cooldown[model] - current_time)
-            return {
-                "status": "cooldown",
-                "remaining_seconds": remaining_wait,
-                "requests_available": 0
-            }
-        
-        # Initialize timestamp list if needed
-        if model not in self.last_request_time:
-            self.last_request_time[model] = []
-        
-        # Remove timestamps older than 60 seconds
-        self.last_request_time[model] = [
-            t for t in self.last_request_time[model] 
-            if current_time - t < 60
-        ]
-        
-        # Calculate available requests
-        model_limits = RATE_LIMITS.get(model, {"requests_per_minute": 10})
-        requests_made = len(self.last_request_time[model])
-        requests_available = max(0, model_limits["requests_per_minute"] - requests_made)
-        
-        return {
-            "status": "ok",
-            "requests_available": requests_available,
-            "requests_made": requests_made,
-            "limit": model_limits["requests_per_minute"]
-        }
+# Create a global rate limiter (shared across processes when RATE_LIMIT_DB is set)
+rate_limiter = rate_limit.create_rate_limiter(RATE_LIMITS)
+
+# Audio is billed at roughly 32 tokens per second of sound
+AUDIO_TOKENS_PER_SECOND = 32
+# Approximate bytes per second of audio for each MIME type, used to estimate duration
+AUDIO_BYTES_PER_SECOND = {
+    'audio/wav': 32000,   # 16 kHz mono 16-bit
+    'audio/ogg': 4000,    # 32 kbps Opus segments
+    'audio/flac': 16000,
+    'audio/mpeg': 16000,
+    'audio/m4a': 16000,
+}
 
-# Create a global rate limiter
-rate_limiter = RateLimiter()
+def estimate_audio_tokens(num_bytes, mime_type):
+    """Roughly estimate the tokens Gemini will bill for an audio payload."""
+    seconds = num_bytes / AUDIO_BYTES_PER_SECOND.get(mime_type, 16000)
+    return int(seconds * AUDIO_TOKENS_PER_SECOND)
+
+def estimate_request_tokens(contents):
+    """Estimate the input tokens of a generate_content request before sending it."""
+    tokens = 0
+    for message in contents or []:
+        for part in message.get("parts", []):
+            if "text" in part:
+                tokens += estimate_tokens(part["text"])
+            elif "inline_data" in part:
+                tokens += estimate_audio_tokens(len(part["inline_data"]["data"]), part["inline_data"]["mime_type"])
+    return tokens
+
+# Retries of a rate-limited (429) API call, with exponential backoff from this delay
+API_MAX_RETRIES = 3
+API_RETRY_BASE_DELAY = 2  # seconds
+
+def rate_limit_retry_delay(error, attempt):
+    """Seconds to cool down before retrying a rate-limited call, or None if error is not a 429"""
+    error_message = str(error)
+    if "429" not in error_message or "RESOURCE_EXHAUSTED" not in error_message:
+        return None
+    # Try to extract retry delay from the error
+    retry_delay_match = re.search(r"retryDelay': '(\d+)s'", error_message)
+    if retry_delay_match:
+        return int(retry_delay_match.group(1))
+    return API_RETRY_BASE_DELAY * (2 ** attempt)
 
 # Helper function for API calls with rate limiting
 def api_call_with_rate_limiting(model_name, func, *args, **kwargs):
     """Execute an API call with rate limiting and retry logic."""
-    max_retries = 3
-    base_delay = 2  # seconds
+    max_retries = API_MAX_RETRIES
+    
+    # Callers that send files by reference know the size better than we can infer here
+    estimated_tokens = kwargs.pop('estimated_tokens', None)
     
     for attempt in range(max_retries + 1):
-        # Check rate limit before attempting
-        can_proceed, message = rate_limiter.check_rate_limit(model_name)
-        
-        if not can_proceed:
-            if attempt < max_retries:
-                # Calculate exponential backoff delay
-                delay = message.split(':', 1)[1].strip() if ':' in message else "2s"
-                if 'cooldown' in message:
-                    delay_seconds = int(delay.split('s')[0])
-                else:
-                    delay_seconds = base_delay * (2 ** attempt)
-                
-                logger.info(f"Rate limit reached. Waiting {delay_seconds}s before retry {attempt+1}/{max_retries}")
-                time.sleep(delay_seconds)
-                continue
-            else:
-                raise Exception(f"Rate limit exceeded: {message}. Max retries reached.")
+        # Block until both the request and token buckets have room
+        reserved_tokens = estimated_tokens if estimated_tokens is not None else estimate_request_tokens(kwargs.get('contents'))
+        rate_limiter.acquire(model_name, tokens=reserved_tokens)
         
         try:
-            # Record this request
-            rate_limiter.record_request(model_name)
-            
             # Add the model parameter to kwargs if we're calling generate_content
             if func.__name__ == 'generate_content' and 'model' not in kwargs:
                 kwargs['model'] = model_name
             
             # Execute the actual API call
-            return func(*args, **kwargs)
+            response = func(*args, **kwargs)
+            
+            # Settle the token bucket with the real usage
+            usage = getattr(response, 'usage_metadata', None)
+            if usage is not None and usage.total_token_count is not None:
+                rate_limiter.record_usage(model_name, usage.total_token_count, reserved_tokens)
+            return response
             
         except Exception as e:
             error_message = str(e)
+            # The call failed, so give back the tokens reserved for it
+            rate_limiter.record_usage(model_name, 0, reserved_tokens)
             
             # Check if this is a rate limit error
-            if "429" in error_message and "RESOURCE_EXHAUSTED" in error_message:
+            delay_seconds = rate_limit_retry_delay(e, attempt)
+            if delay_seconds is not None:
                 if attempt < max_retries:
-                    # Try to extract retry delay from the error
-                    retry_delay_match = re.search(r"retryDelay': '(\d+)s'", error_message)
-                    if retry_delay_match:
-                        delay_seconds = int(retry_delay_match.group(1))
-                    else:
-                        delay_seconds = base_delay * (2 ** attempt)
-                    
-                    logger.info(f"Rate limit hit (429). Waiting {delay_seconds}s before retry {attempt+1}/{max_retries}")
-                    
-                    # Update the rate limiter's cooldown
-                    rate_limiter.in_cooldown[model_name] = time.time() + delay_seconds
+                    logger.info(f"Rate limit hit (429). Cooling down {delay_seconds}s before retry {attempt+1}/{max_retries}")
                     
-                    time.sleep(delay_seconds)
+                    # Drain the bucket so every caller waits, then block on it in the next attempt
+                    rate_limiter.cooldown(model_name, delay_seconds)
                     continue
             
             # For other errors or if we've hit max retries, re-raise
             logger.error(f"API call error: {error_message}")
             raise
 
-def transcribe_audio(audio_path):
+SEGMENT_PROMPT = """
+    Please transcribe this audio segment accurately. If there are multiple speakers, 
+    identify and label each speaker as Speaker 1, Speaker 2, etc., based on their unique voice characteristics 
+    such as tone, pitch, and speech patterns. If the speaker's name is mentioned or can be inferred, 
+    use their name instead of Speaker X for identification.
+
+    Format the transcript as:
+    Speaker X: [transcribed text]
+    or
+    [Speaker Name]: [transcribed text]
+
+    Ensure consistency in speaker labeling across segments. If the same speaker continues from a previous segment, 
+    maintain the same label or name. Clearly differentiate between speakers and provide a clean, readable transcript.
+"""
+
+FILE_PROMPT = """
+    Please transcribe this audio file accurately. If there are multiple speakers,
+    clearly identify and label each speaker as Speaker 1, Speaker 2, etc.
+    Format the transcript as:
+    Speaker X: [transcribed text]
+    
+    Differentiate speakers based on voice characteristics, tone, pitch, and speech patterns.
+"""
+
+# Audio larger than this is sent through the Gemini Files API instead of inline in the request
+INLINE_AUDIO_LIMIT = int(os.environ.get('INLINE_AUDIO_LIMIT', 4 * 1024 * 1024))
+
+def transcribe_file(audio_path, prompt):
+    """
+    Send one audio file to Gemini and return the response.
+
+    Small files go inline; larger ones are uploaded with the Files API so the audio is
+    streamed from disk instead of being held in memory and base64-encoded into the request.
+    """
+    file_ext = os.path.splitext(audio_path)[1][1:].lower()
+    mime_type = get_mime_type(file_ext)
+    file_size = os.path.getsize(audio_path)
+    uploaded = None
+    
+    if file_size > INLINE_AUDIO_LIMIT:
+        uploaded = client.files.upload(file=audio_path, config={'mime_type': mime_type})
+        logger.info(f"Uploaded {audio_path} ({file_size} bytes) via Files API as {uploaded.name}")
+        audio_part = {"file_data": {"file_uri": uploaded.uri, "mime_type": mime_type}}
+    else:
+        with open(audio_path, 'rb') as audio_file:
+            audio_part = {"inline_data": {"mime_type": mime_type, "data": audio_file.read()}}
+    
+    try:
+        return api_call_with_rate_limiting(
+            TRANSCRIPTION_MODEL,
+            client.models.generate_content,
+            contents=[
+                {"role": "user", "parts": [
+                    {"text": prompt},
+                    audio_part
+                ]}
+            ],
+            estimated_tokens=estimate_tokens(prompt) + estimate_audio_tokens(file_size, mime_type)
+        )
+    finally:
+        if uploaded is not None:
+            try:
+                client.files.delete(name=uploaded.name)
+            except Exception as e:
+                logger.warning(f"Could not delete uploaded file {uploaded.name}: {str(e)}")
+
+def transcribe_segment(segment_path):
+    """Transcribe a single audio segment and return its text, token usage and latency."""
+    start_time = time.time()
+    try:
+        response = transcribe_file(segment_path, SEGMENT_PROMPT)
+        return {
+            "text": response.text or "",
+            "token_usage": get_token_from_response(response),
+            "latency": time.time() - start_time
+        }
+    finally:
+        # Clean up segment file
+        if os.path.exists(segment_path):
+            os.remove(segment_path)
+
+def transcribe_audio(audio_path, session_id=None, progress=None):
+    """
+    Transcribe an audio file, segmenting long recordings.
+
+    session_id selects the ApiCostTracker to charge and progress(stage, fraction) is an
+    optional callback used by background jobs to report how far along we are.
+    """
     try:
         # Get the file extension for MIME type
         file_ext = os.path.splitext(audio_path)[1][1:].lower()
@@ -398,112 +407,68 @@ def transcribe_audio(audio_path):
         print(f"Transcribing audio with MIME type: {mime_type}")
         
         # First try to segment the audio to identify potential speakers
+        if progress:
+            progress('segmenting')
         segment_files = segment_audio(audio_path)
         
         if len(segment_files) > 1:
             # Process segments for speaker identification
-            full_transcript = []
+            workers = max(1, min(TRANSCRIPTION_WORKERS, len(segment_files)))
+            logger.info(f"Transcribing {len(segment_files)} segments with {workers} workers")
+            if progress:
+                progress('transcribing', 0.0)
             
-            for i, segment_path in enumerate(segment_files):
-                with open(segment_path, 'rb') as audio_file:
-                    audio_content = audio_file.read()
-                
-                # Specific prompt for speaker identification
-                prompt = """
-                    Please transcribe this audio segment accurately. If there are multiple speakers, 
-                    identify and label each speaker as Speaker 1, Speaker 2, etc., based on their unique voice characteristics 
-                    such as tone, pitch, and speech patterns. If the speaker's name is mentioned or can be inferred, 
-                    use their name instead of Speaker X for identification.
-
-                    Format the transcript as:
-                    Speaker X: [transcribed text]
-                    or
-                    [Speaker Name]: [transcribed text]
-
-                    Ensure consistency in speaker labeling across segments. If the same speaker continues from a previous segment, 
-                    maintain the same label or name. Clearly differentiate between speakers and provide a clean, readable transcript.
-                """
-                
-                # Since segments are always converted to WAV
-                response = api_call_with_rate_limiting(
-                    TRANSCRIPTION_MODEL,
-                    client.models.generate_content,
-                    contents=[
-                        {"role": "user", "parts": [
-                            {"text": prompt},
-                            {"inline_data": {"mime_type": "audio/wav", "data": audio_content}}
-                        ]}
-                    ]
-                )
-                # print(f">>> {response}")
-                # Track token usage and cost
-                # Rough estimation of prompt tokens
-                # prompt_tokens = estimate_tokens(prompt)
-                # # Rough estimation of response tokens
-                # response_tokens = estimate_tokens(response.text)
-                # total_tokens = prompt_tokens + response_tokens
-                token_usage = get_token_from_response(response)
-                total_tokens = token_usage["total_token_count"]
-                
-                # Get or create session cost tracker
-                session_id = request.environ.get('HTTP_X_SESSION_ID')
-                if session_id and session_id not in session_costs:
-                    session_costs[session_id] = CostTracker()
-                
-                if session_id:
-                    session_costs[session_id].add_request(
-                        "transcription", total_tokens, TRANSCRIPTION_MODEL)
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(transcribe_segment, path) for path in segment_files]
+                for completed, _ in enumerate(as_completed(futures), 1):
+                    if progress:
+                        progress('transcribing', completed / len(futures))
+                # Collect in segment order regardless of completion order
+                results = [future.result() for future in futures]
+            
+            full_transcript = []
+            token_usage = {"total_token_count": 0, "prompt_tokens": 0, "response_tokens": 0}
+            for i, result in enumerate(results):
+                logger.info(f"Segment {i}: {result['latency']:.2f}s, tokens: {result['token_usage']}")
+                for key in token_usage:
+                    token_usage[key] += result['token_usage'].get(key) or 0
                 
-                if response.text.strip():
-                    full_transcript.append(response.text)
+                charge_session(session_id, "transcription", TRANSCRIPTION_MODEL, result['token_usage'])
                 
-                # Clean up segment file
-                os.remove(segment_path)
+                if result['text'].strip():
+                    full_transcript.append(result['text'])
             
             return {
-                "transcript": "\n".join(full_transcript),
-                "token_usage": token_usage
+                # Segments overlap, so de-duplicate boundaries and reconcile speaker labels
+                "transcript": stitching.stitch_transcripts(full_transcript, SEGMENT_OVERLAP_SECONDS),
+                "token_usage": token_usage,
+                "segments": [
+                    {"segment": i, "latency": r['latency'], "token_usage": r['token_usage']}
+                    for i, r in enumerate(results)
+                ]
                 }
         else:
             # Single audio file processing with speaker detection request
-            with open(audio_path, 'rb') as audio_file:
-                audio_content = audio_file.read()
-            
-            prompt = """
-            Please transcribe this audio file accurately. If there are multiple speakers,
-            clearly identify and label each speaker as Speaker 1, Speaker 2, etc.
-            Format the transcript as:
-            Speaker X: [transcribed text]
-            
-            Differentiate speakers based on voice characteristics, tone, pitch, and speech patterns.
-            """
+            if progress:
+                progress('transcribing', 0.0)
             
-            response = api_call_with_rate_limiting(
-                TRANSCRIPTION_MODEL,
-                client.models.generate_content,
-                contents=[
-                    {"role": "user", "parts": [
-                        {"text": prompt},
-                        {"inline_data": {"mime_type": mime_type, "data": audio_content}}
-                    ]}
-                ]
-            )
+            # Uncompressed WAV is re-encoded to Opus, shrinking the upload several-fold (when ffmpeg has libopus)
+            compressed_path = None
+            if file_ext == 'wav':
+                compressed_path = segmenter.compress_audio(audio_path, app.config['UPLOAD_FOLDER'])
+            try:
+                response = transcribe_file(compressed_path or audio_path, FILE_PROMPT)
+            finally:
+                if compressed_path and os.path.exists(compressed_path):
+                    os.remove(compressed_path)
             
             # # Track token usage and cost
             # prompt_tokens = estimate_tokens(prompt)
             # response_tokens = estimate_tokens(response.text)
             # total_tokens = prompt_tokens + response_tokens
             token_usage = get_token_from_response(response)
-            total_tokens = token_usage["total_token_count"]
             
-            # Get or create session cost tracker
-            session_id = request.environ.get('HTTP_X_SESSION_ID')
-            if session_id and session_id not in session_costs:
-                session_costs[session_id] = CostTracker()
-            
-            if session_id:
-                session_costs[session_id].add_request(
-                    "transcription", total_tokens, TRANSCRIPTION_MODEL)
+            charge_session(session_id, "transcription", TRANSCRIPTION_MODEL, token_usage)
             
             return {
                 "transcript": response.text, 
@@ -513,10 +478,7 @@ def transcribe_audio(audio_path):
         print(f"Transcription error: {str(e)}")
         return f"Error during transcription: {str(e)}"
 
-def generate_summary(transcript):
-    """Generate a summary of the transcript using Gemini API."""
-    try:
-        prompt = f"""
+SUMMARY_PROMPT = """
         Please provide a detailed and comprehensive summary of the following transcript.
         Ensure that all key points, main topics discussed, and important conclusions are covered thoroughly.
         Highlight any significant details, decisions, or insights shared during the conversation.
@@ -551,82 +513,202 @@ def generate_summary(transcript):
         Transcript:
         {transcript}
         """
+
+# Bump when the summary prompts change so cached partial summaries are not reused
+SUMMARY_PROMPT_VERSION = "v1"
+# Transcripts longer than this are summarized in chunks of up to this many characters
+SUMMARY_CHUNK_CHARS = int(os.environ.get('SUMMARY_CHUNK_CHARS', 40000))
+# Number of chunks summarized concurrently (still bounded by RATE_LIMITS)
+SUMMARY_WORKERS = int(os.environ.get('SUMMARY_WORKERS', 4))
+
+CHUNK_SUMMARY_PROMPT = """
+        The following is one part of a longer transcript. Write detailed notes on this part only;
+        they will be combined with the notes on the other parts into a single summary.
+
+        Cover the topics discussed, key points and conclusions, decisions, action items and
+        who they belong to, and any notable insights. Keep speaker names or labels as they appear.
+        Use plain bullet points and do not add a title.
+
+        Transcript part:
+        {chunk}
+        """
+
+# Prefix for the final summary prompt when it is built from chunk notes
+CHUNK_NOTES_HEADER = "The transcript was summarized in consecutive parts; these are the notes on each part, in order."
+
+
+def add_token_usage(total, usage):
+    """Add one response's token usage into a running total"""
+    for key in total:
+        total[key] += usage.get(key) or 0
+
+
+def summarize_chunk(chunk):
+    """Summarize one transcript chunk; returns (notes, token_usage)"""
+    response = api_call_with_rate_limiting(
+        SUMMARY_MODEL,
+        client.models.generate_content,
+        contents=[{"role": "user", "parts": [{"text": CHUNK_SUMMARY_PROMPT.format(chunk=chunk)}]}]
+    )
+    return response.text, get_token_from_response(response)
+
+
+def summarize_chunks(chunks, token_usage):
+    """Summarize chunks in parallel, reusing cached partial summaries; returns notes in order"""
+    keys = [summarizer.partial_key(SUMMARY_MODEL, SUMMARY_PROMPT_VERSION, chunk) for chunk in chunks]
+    notes = summarizer.get_partials(user_auth.db.summary_partials, keys)
+    missing = [i for i, key in enumerate(keys) if key not in notes]
+    logger.info(f"Summarizing {len(missing)} of {len(chunks)} chunks ({len(chunks) - len(missing)} cached)")
+    
+    if missing:
+        workers = max(1, min(SUMMARY_WORKERS, len(missing)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {i: executor.submit(summarize_chunk, chunks[i]) for i in missing}
+            for i, future in futures.items():
+                text, usage = future.result()
+                add_token_usage(token_usage, usage)
+                notes[keys[i]] = text
+                summarizer.store_partial(user_auth.db.summary_partials, keys[i], text)
+    
+    return [notes[key] for key in keys]
+
+
+def generate_summary(transcript, session_id=None, use_cache=True):
+    """
+    Generate a summary of the transcript using Gemini API, charged to session_id.
+
+    Long transcripts are summarized chunk by chunk and the chunk notes are reduced into
+    the final summary, repeating the reduction until the notes fit in one prompt.
+    A previous summary of the same transcript is returned unless use_cache is False.
+    """
+    # The chunk size changes how long transcripts are summarized, so it is part of the key
+    cache_key = response_cache.make_key(SUMMARY_MODEL, SUMMARY_PROMPT_VERSION, SUMMARY_CHUNK_CHARS, transcript)
+    if use_cache:
+        cached = cached_responses.get(cache_key)
+        if cached:
+            return {'summary': cached['text'], 'token_usage': cached['token_usage'], 'cached': True}
+    
+    try:
+        token_usage = {"total_token_count": 0, "prompt_tokens": 0, "response_tokens": 0}
+        content = transcript
+        chunks = summarizer.chunk_turns(transcript, SUMMARY_CHUNK_CHARS)
+        while len(chunks) > 1:
+            notes = summarize_chunks(chunks, token_usage)
+            content = CHUNK_NOTES_HEADER + "\n\n" + "\n\n".join(
+                f"Part {i}:\n{note}" for i, note in enumerate(notes, 1))
+            reduced = summarizer.chunk_turns(content, SUMMARY_CHUNK_CHARS)
+            # Stop if another round would not make the notes any shorter
+            chunks = reduced if len(reduced) < len(chunks) else [content]
         
-        # Use the same model that works for transcription
         response = api_call_with_rate_limiting(
             SUMMARY_MODEL,
             client.models.generate_content,
-            contents=[{"role": "user", "parts": [{"text": prompt}]}]
+            contents=[{"role": "user", "parts": [{"text": SUMMARY_PROMPT.format(transcript=content)}]}]
         )
         
-        # print(f">>> Summary: {response}")
-        # print(dir(response))
-
         # Track token usage and cost
-        # prompt_tokens = estimate_tokens(prompt)
-        # response_tokens = estimate_tokens(response.text)
-        # print(f' usage_metadata: {response.usage_metadata}')
-        # prompt_tokens = response.usage_metadata.prompt_token_count
-        # print(f' prompt_tokens: {prompt_tokens}')
-        # response_tokens = response.usage_metadata.candidates_token_count
-        # print(f' response_tokens: {response_tokens}')
-        # total_tokens = prompt_tokens + response_tokens
-        token_usage = get_token_from_response(response)
-        total_tokens = token_usage["total_token_count"]
-        
-        # Get or create session cost tracker
-        session_id = request.environ.get('HTTP_X_SESSION_ID')
-        if session_id and session_id not in session_costs:
-            session_costs[session_id] = CostTracker()
+        add_token_usage(token_usage, get_token_from_response(response))
         
-        if session_id:
-            session_costs[session_id].add_request(
-                "text", total_tokens, SUMMARY_MODEL)
+        charge_session(session_id, "summary", SUMMARY_MODEL, token_usage)
+        cached_responses.put(cache_key, response.text, token_usage)
         
         return {'summary': response.text, 
-                'token_usage': token_usage
+                'token_usage': token_usage,
+                'cached': False
                 }
     except Exception as e:
         print(f"Summary generation error: {str(e)}")
         return f"Could not generate summary due to an error: {str(e)}"
 
-def answer_question(transcript, question):
-    """Answer questions about the transcript using Gemini API."""
+def embed_texts(texts, task_type, user_id, session_id=None):
+    """
+    Embed a list of texts, batching requests under the rate limiter.
+
+    Each request is recorded for user_id and charged to session_id. Embedding responses
+    carry no usage metadata, so their tokens are the estimate the limiter reserved.
+    """
+    vectors = []
+    for start in range(0, len(texts), EMBED_BATCH_SIZE):
+        batch = texts[start:start + EMBED_BATCH_SIZE]
+        tokens = sum(estimate_tokens(text) for text in batch)
+        response = api_call_with_rate_limiting(
+            EMBEDDING_MODEL,
+            client.models.embed_content,
+            model=EMBEDDING_MODEL,
+            contents=batch,
+            config=types.EmbedContentConfig(task_type=task_type),
+            estimated_tokens=tokens
+        )
+        vectors.extend(embedding.values for embedding in response.embeddings)
+        charge_session(session_id, "embedding", EMBEDDING_MODEL,
+                       {"total_token_count": tokens, "prompt_tokens": tokens, "response_tokens": 0})
+        record_api_call(user_id, "embedding", tokens, tokens, 0, EMBEDDING_MODEL)
+    return vectors
+
+
+def index_transcript(user_id, transcript_id, transcript, session_id=None):
+    """Chunk and embed a transcript for retrieval; returns the index or None if it is sent whole"""
+    chunks = retrieval.chunk_transcript(transcript)
+    if len(chunks) <= RETRIEVAL_TOP_K:
+        return None
+    index = retrieval.build_index(chunks, embed_texts(chunks, "RETRIEVAL_DOCUMENT", user_id, session_id),
+                                  EMBEDDING_MODEL)
+    user_auth.save_transcript_index(user_id, transcript_id, index)
+    logger.info(f"Indexed transcript {transcript_id} as {len(chunks)} chunks")
+    return index
+
+
+def select_question_context(transcript, question, user_id, transcript_id, session_id=None):
+    """
+    Return the parts of a transcript relevant to a question (the whole transcript if it is
+    short); the embedding requests are charged to session_id.
+    """
+    if len(retrieval.chunk_transcript(transcript)) <= RETRIEVAL_TOP_K:
+        return transcript
     try:
-        prompt = f"""
+        index = user_auth.get_transcript_index(user_id, transcript_id)
+        if not index or index.get('model') != EMBEDDING_MODEL:
+            # Transcripts saved before retrieval was added are indexed on first use
+            index = index_transcript(user_id, transcript_id, transcript, session_id)
+        question_vector = embed_texts([question], "RETRIEVAL_QUERY", user_id, session_id)[0]
+        return "\n...\n".join(retrieval.top_chunks(index, question_vector, RETRIEVAL_TOP_K))
+    except Exception as e:
+        logger.error(f"Retrieval failed for transcript {transcript_id}, sending it whole: {str(e)}")
+        return transcript
+
+
+def build_question_contents(context, question):
+    """Build the generate_content contents for a question about transcript excerpts"""
+    prompt = f"""
         You are analyzing a transcript and answering questions about it.
+        The excerpts below are the parts of the transcript most relevant to the question,
+        in their original order.
         
         Transcript:
-        {transcript}
+        {context}
         
         Question: {question}
         
         Please answer the question based on the information in the transcript only.
         If the transcript doesn't contain the information needed, say so clearly.
         """
-        
+    return [{"role": "user", "parts": [{"text": prompt}]}]
+
+
+def answer_question(context, question, session_id=None):
+    """Answer questions about the transcript using Gemini API, charged to session_id."""
+    try:
         # Use the same model that works for transcription
         response = api_call_with_rate_limiting(
             QnA_MODEL,
             client.models.generate_content,
-            contents=[{"role": "user", "parts": [{"text": prompt}]}]
+            contents=build_question_contents(context, question)
         )
         
         # Track token usage and cost
-        # prompt_tokens = estimate_tokens(prompt)
-        # response_tokens = estimate_tokens(response.text)
-        # total_tokens = prompt_tokens + response_tokens
         token_usage = get_token_from_response(response)
-        total_tokens = token_usage["total_token_count"]
-        
-        # Get or create session cost tracker
-        session_id = request.environ.get('HTTP_X_SESSION_ID')
-        if session_id and session_id not in session_costs:
-            session_costs[session_id] = CostTracker()
         
-        if session_id:
-            session_costs[session_id].add_request(
-                "text", total_tokens, QnA_MODEL)
+        charge_session(session_id, "qa", QnA_MODEL, token_usage)
         
         return {"response": response.text,
                 "token_usage": token_usage
@@ -636,6 +718,64 @@ def answer_question(transcript, question):
         print(f"Question answering error: {str(e)}")
         return f"Error processing your question: {str(e)}"
 
+
+def open_answer_stream(contents):
+    """
+    Start streaming an answer and return an iterator over its chunks.
+
+    Errors raised before the first chunk arrives (the API may only report a 429 once
+    the stream is read) are retried like any other call, since nothing was sent yet.
+    """
+    for attempt in range(API_MAX_RETRIES + 1):
+        stream = iter(api_call_with_rate_limiting(
+            QnA_MODEL,
+            client.models.generate_content_stream,
+            model=QnA_MODEL,
+            contents=contents
+        ))
+        try:
+            first = next(stream, None)
+        except Exception as e:
+            # No tokens were used, so give back this attempt's reservation before any retry
+            rate_limiter.record_usage(QnA_MODEL, 0, estimate_request_tokens(contents))
+            delay_seconds = rate_limit_retry_delay(e, attempt)
+            if delay_seconds is None or attempt == API_MAX_RETRIES:
+                raise
+            logger.info(f"Rate limit hit (429) opening answer stream. Cooling down {delay_seconds}s before retry {attempt+1}/{API_MAX_RETRIES}")
+            rate_limiter.cooldown(QnA_MODEL, delay_seconds)
+            continue
+        return itertools.chain([first], stream) if first is not None else stream
+
+
+def stream_answer(context, question):
+    """Yield answer text as it is generated, then the token usage dict"""
+    contents = build_question_contents(context, question)
+    usage = None
+    try:
+        for chunk in open_answer_stream(contents):
+            if chunk.usage_metadata is not None:
+                usage = chunk
+            if chunk.text:
+                yield chunk.text
+    except Exception as e:
+        # Part of the answer was already sent, so it can't be retried; still make other callers back off
+        delay_seconds = rate_limit_retry_delay(e, 0)
+        if delay_seconds is not None:
+            rate_limiter.cooldown(QnA_MODEL, delay_seconds)
+        raise
+    
+    token_usage = get_token_from_response(usage) if usage else {
+        "total_token_count": 0, "prompt_tokens": 0, "response_tokens": 0}
+    # The limiter only saw an estimate when the stream was opened
+    rate_limiter.record_usage(QnA_MODEL, token_usage["total_token_count"] or 0, estimate_request_tokens(contents))
+    yield token_usage
+
+
+def server_sent_event(data, event=None):
+    """Format one server-sent event"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
 @app.route('/')
 def index():
     # Check if user is logged in
@@ -646,12 +786,18 @@ def index():
 
 @app.route('/audio/<filename>')
 def serve_audio(filename):
-    """Serve cached audio files for playback."""
-    return send_from_directory(app.config['AUDIO_CACHE'], filename)
-
-def generate_cache_filename(file_obj, filename):
-    """Generate a unique cache filename based on the file content."""
-    # Use MD5 hash of the file content for uniqueness
+    """Serve cached audio files for playback, answering Range and conditional requests."""
+    response = send_from_directory(
+        app.config['AUDIO_CACHE'], filename,
+        conditional=True, etag=True, max_age=AUDIO_CACHE_MAX_AGE
+    )
+    # Cached audio is named by its content hash, so a URL never changes content
+    response.cache_control.public = True
+    audio_cache_manager.touch(filename)
+    return response
+
+def hash_file(file_obj):
+    """Return the MD5 hex digest of a file object or file path."""
     hasher = hashlib.md5()
     
     # Check if file_obj is a FileStorage object (from Flask uploads)
@@ -673,12 +819,62 @@ def generate_cache_filename(file_obj, filename):
             while chunk := f.read(8192):
                 hasher.update(chunk)
     
-    hash_hex = hasher.hexdigest()
-    return f"{hash_hex}_{filename}"
+    return hasher.hexdigest()
+
+# Chunk size used when streaming uploads to disk
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+def save_upload(file_storage, filepath):
+    """Write an uploaded file to disk and return its MD5, hashing in the same pass."""
+    hasher = hashlib.md5()
+    with open(filepath, 'wb') as out:
+        while chunk := file_storage.stream.read(UPLOAD_CHUNK_SIZE):
+            hasher.update(chunk)
+            out.write(chunk)
+    return hasher.hexdigest()
+
+def link_or_copy(src, dst):
+    """Hardlink src to dst, falling back to a copy when they are on different filesystems."""
+    if os.path.exists(dst):
+        return dst
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+    return dst
+
+def add_to_audio_cache(cache_filename, create):
+    """
+    Make sure cache_filename is in the audio cache, writing it with create(path) if missing,
+    and count it against the cache quota as just used. Returns its playback URL.
+    """
+    cache_path = os.path.join(app.config['AUDIO_CACHE'], cache_filename)
+    # The evictor can remove an existing copy between the check and add(); add() then
+    # reports the miss and the copy is written again (new copies are too recent to evict)
+    while True:
+        if not os.path.exists(cache_path):
+            create(cache_path)
+        if audio_cache_manager.add(cache_filename):
+            return f"/audio/{cache_filename}"
+        logger.info(f"{cache_filename} was evicted from the audio cache before it was recorded, writing it again")
+
+# Buffered writer for API call accounting, shared by all request threads
+api_call_writer = telemetry.BufferedWriter(
+    app.config['MONGO_DB'].api_calls,
+    # Keep per-user/per-model hourly and daily totals up to date as calls are written
+    on_flush=lambda calls: usage_rollups.apply_rollups(app.config['MONGO_DB'], calls)
+)
 
 # NEW: helper function to record each API call
-def record_api_call(user_id, request_type, total_token_count, prompt_tokens, response_tokens, model_version):
-    """Record an API call with token usage and cost into a new collection."""
+def record_api_call(user_id, request_type, total_token_count, prompt_tokens, response_tokens, model_version,
+                    cache_hit=None, tokens_saved=0):
+    """
+    Record an API call with token usage and cost into a new collection.
+
+    cache_hit is True for a request answered from the response cache (no tokens used,
+    tokens_saved are the tokens the original call cost), False for a cacheable request
+    that missed, and None for requests that do not go through the cache.
+    """
     call_doc = {
         "user_id": user_id,
         "request_type": request_type,
@@ -688,16 +884,149 @@ def record_api_call(user_id, request_type, total_token_count, prompt_tokens, res
         "model_version": model_version,
         "datetime": datetime.datetime.utcnow()
     }
-    db = app.config.get("MONGO_DB")
-    # FIX: Compare explicitly with None
-    if db is not None:
-        db.api_calls.insert_one(call_doc)
-        logger.debug(f"API call recorded: {call_doc}")
+    if cache_hit is not None:
+        call_doc["cache_hit"] = cache_hit
+        call_doc["tokens_saved"] = tokens_saved
+    # Written in batches by a background thread, off the request path
+    api_call_writer.write(call_doc)
+    logger.debug(f"API call queued: {call_doc}")
+
+def record_response(user_id, request_type, model_version, token_usage, cache_hit=None):
+    """Record a possibly cached response; a cache hit is recorded as tokens saved, not used"""
+    if cache_hit:
+        record_api_call(user_id, request_type, 0, 0, 0, model_version,
+                        cache_hit=True, tokens_saved=token_usage.get('total_token_count') or 0)
     else:
-        # Fallback if using a global client
-        client = MongoClient()  # Adjust the connection if necessary
-        client.transcriber_db.api_calls.insert_one(call_doc)
-        logger.debug(f"Fallback API call recorded: {call_doc}")
+        record_api_call(user_id, request_type,
+                        token_usage['total_token_count'],
+                        token_usage['prompt_tokens'],
+                        token_usage['response_tokens'],
+                        model_version,
+                        cache_hit=cache_hit)
+
+def run_transcription_job(filepath, filename, user_id, content_hash=None, progress=None):
+    """Run the full transcription pipeline for an uploaded file (executed by the job queue)."""
+    progress = progress or (lambda stage, fraction=None: None)
+    
+    # Generate unique ID for this upload
+    unique_id = uuid.uuid4().hex
+    logger.info(f"Generated session ID: {unique_id}")
+    
+    # Generate a unique session ID for this transcript and its cost tracker
+    session_id = str(uuid.uuid4())
+    cost_tracker = session_costs.start(session_id)
+    
+    # Handle audio differently based on file type
+    audio_url = None
+    audio_path = None
+    try:
+        # Look up a previous transcript of the same recording
+        content_hash = content_hash or hash_file(filepath)
+        db = app.config['MONGO_DB']
+        cached = transcript_cache.get_cached_transcript(
+            db, content_hash, TRANSCRIPTION_MODEL, TRANSCRIPTION_PROMPT_VERSION)
+        transcript_cache.record_cache_event(
+            db, user_id, hit=cached is not None,
+            tokens_saved=cached['token_usage'].get('total_token_count', 0) if cached else 0)
+        
+        if filename.lower().endswith('.mp4'):
+            logger.info("Processing MP4 file")
+
+            def extract_track():
+                progress('extracting_audio')
+                # Demux only the audio track into a per-job temp file so concurrent jobs don't collide
+                path = segmenter.extract_audio(filepath, app.config['UPLOAD_FOLDER'], f'{unique_id}_temp_audio')
+                logger.info(f"Extracted audio from video to {path}")
+                return path
+
+            def link_extracted_track(cache_path):
+                nonlocal audio_path
+                audio_path = audio_path or extract_track()
+                link_or_copy(audio_path, cache_path)
+
+            # The track is transcribed unless the transcript is cached; playback reuses the
+            # audio from a previous upload of the same video when it is still in the cache
+            if not cached:
+                audio_path = extract_track()
+            audio_url = add_to_audio_cache(f"{content_hash}_audio.{segmenter.PLAYBACK_EXTENSION}",
+                                           link_extracted_track)
+        elif os.path.splitext(filename)[1][1:].lower() in PLAYBACK_PASSTHROUGH_EXTENSIONS:
+            # Link the upload into the cache for playback, named by the MD5 hash of the content
+            audio_url = add_to_audio_cache(f"{content_hash}_{filename}",
+                                           lambda cache_path: link_or_copy(filepath, cache_path))
+        else:
+            # Uncompressed uploads (WAV) are encoded once into a compact playback copy
+            def encode_track(cache_path):
+                progress('encoding_playback')
+                segmenter.encode_playback(filepath, cache_path)
+
+            try:
+                audio_url = add_to_audio_cache(f"{content_hash}_audio.{segmenter.PLAYBACK_EXTENSION}", encode_track)
+            except (subprocess.CalledProcessError, OSError) as e:
+                # A failed playback encode must not stop the transcription; play the upload as it is
+                logger.error(f"Failed to encode playback audio for {filename}, caching the upload instead: {str(e)}")
+                audio_url = add_to_audio_cache(f"{content_hash}_{filename}",
+                                               lambda cache_path: link_or_copy(filepath, cache_path))
+        logger.info(f"Audio cached at: {audio_url}")
+        
+        if cached:
+            logger.info(f"Transcript cache hit for {content_hash}")
+            transcript = cached['transcript']
+            # Nothing was sent to Gemini for this upload
+            usage_metadata = {"total_token_count": 0, "prompt_tokens": 0, "response_tokens": 0}
+        else:
+            response = transcribe_audio(audio_path or filepath, session_id=session_id, progress=progress)
+            if not isinstance(response, dict):
+                raise RuntimeError(response)
+            transcript = response['transcript']
+            usage_metadata = response['token_usage']
+            transcript_cache.store_transcript(
+                db, content_hash, TRANSCRIPTION_MODEL, TRANSCRIPTION_PROMPT_VERSION,
+                transcript, usage_metadata)
+        logger.info("Transcription completed successfully")
+        
+        progress('saving')
+        transcript_data = {
+            'transcript': transcript,
+            'audioUrl': audio_url,
+            'summary': '',  # Initialize with empty summary
+            'transcript_id': session_id,  # Use the same session_id as transcript_id for consistency
+            "api_cost": cost_tracker.total_cost,
+            "total_token_count": cost_tracker.total_tokens,
+            "prompt_tokens": 0,  # Placeholder, update with actual prompt tokens
+            "response_tokens": 0,  # Placeholder, update with actual response tokens
+            "model_version": TRANSCRIPTION_MODEL
+        }
+        transcript_data.update(usage_metadata)
+        user_auth.save_user_transcript(user_id, transcript_data)
+        stored_transcripts.put(session_id, user_id, transcript)
+        
+        progress('indexing')
+        try:
+            index_transcript(user_id, session_id, transcript, session_id)
+        except Exception as e:
+            # Not fatal: the transcript is indexed again on its first question
+            logger.error(f"Failed to index transcript {session_id}: {str(e)}")
+        # Record API call details in new collection (for tracking over all users)
+        if not cached:
+            record_api_call(user_id, "transcription",
+                usage_metadata['total_token_count'],
+                usage_metadata['prompt_tokens'],
+                usage_metadata['response_tokens'],
+                TRANSCRIPTION_MODEL
+            )
+        
+        return {
+            'transcript': transcript,
+            'audioUrl': audio_url,
+            'sessionId': session_id,
+            'user_id': user_id
+        }
+    finally:
+        # Clean up original upload and any extracted audio
+        for path in (filepath, audio_path):
+            if path and os.path.exists(path):
+                os.remove(path)
 
 @app.route('/transcribe', methods=['POST'])
 def transcribe():
@@ -724,283 +1053,305 @@ def transcribe():
         logger.warning(f"Unsupported file format: {file_ext}")
         return jsonify({'error': f'Unsupported file format. Allowed formats: mp3, m4a, wav, mp4'}), 400
     
-    # Generate unique ID for this upload
-    unique_id = uuid.uuid4().hex
-    logger.info(f"Generated session ID: {unique_id}")
+    # Save the original file under a per-upload name so concurrent jobs don't collide
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{uuid.uuid4().hex[:8]}_{filename}")
+    content_hash = save_upload(file, filepath)
+    logger.info(f"File saved to: {filepath} (md5 {content_hash})")
     
-    # Save the original file
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    file.save(filepath)
-    logger.info(f"File saved to: {filepath}")
+    # Hand the rest of the pipeline to a background worker
+    job_id = job_queue.submit(session['user_id'], run_transcription_job,
+                              filepath, filename, session['user_id'], content_hash=content_hash)
+    logger.info(f"Transcription job queued: {job_id}")
     
-    # Create a copy for playback
-    # Generate a unique cache filename using MD5 hash - now using the file object correctly
-    cache_filename = generate_cache_filename(file, filename)
-    cached_path = os.path.join(app.config['AUDIO_CACHE'], cache_filename)
+    return jsonify({
+        'jobId': job_id,
+        'status': jobs.JOB_QUEUED,
+        'statusUrl': url_for('get_job_status', job_id=job_id),
+        'resultUrl': url_for('get_job_result', job_id=job_id)
+    }), 202
+
+def get_user_job(job_id):
+    """Return the job if it belongs to the logged in user, else None."""
+    job = job_queue.store.get(job_id)
+    if not job or job.get('user_id') != session.get('user_id'):
+        return None
+    return job
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """Report the status and per-stage progress of a transcription job."""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
     
-    # Handle audio differently based on file type
-    audio_url = None
-    try:
-        if filename.lower().endswith('.mp4'):
-            logger.info("Processing MP4 file")
-            video = VideoFileClip(filepath)
-            audio_path = os.path.join(app.config['UPLOAD_FOLDER'], 'temp_audio.wav')
-            video.audio.write_audiofile(audio_path)
-            logger.info("Extracted audio from video")
-            
-            # Also save a copy in cache for playback
-            audio_cache_filename = f"{unique_id}_audio.wav"
-            audio_cache_path = os.path.join(app.config['AUDIO_CACHE'], audio_cache_filename)
-            shutil.copy2(audio_path, audio_cache_path)
-            audio_url = f"/audio/{audio_cache_filename}"
-            logger.info(f"Audio cached at: {audio_url}")
-            
-            response = transcribe_audio(audio_path)
-            transcript = response['transcript']
-            usage_metadata = response['token_usage']
-            os.remove(audio_path)
-        else:
-            # Copy the file to cache for playback
-            shutil.copy2(filepath, cached_path)
-            audio_url = f"/audio/{cache_filename}"
-            logger.info(f"Audio cached at: {audio_url}")
-            
-            response = transcribe_audio(filepath)
-            transcript = response['transcript']
-            usage_metadata = response['token_usage']
-        logger.info("Transcription completed successfully")
-        
-        # Clean up original upload
-        os.remove(filepath)
-        
-        # Generate a unique session ID for this transcript
-        session_id = str(uuid.uuid4())
-        
-        # Create a cost tracker for this session
-        session_costs[session_id] = CostTracker()
-        
-        # Store transcript in session for later use in Q&A
-        session[f'transcript_{session_id}'] = transcript
-        logger.info(f"Transcript stored in session with ID: {session_id}")
-        
-        # Set session ID in response header for the client to track
-        response = jsonify({
-            'transcript': transcript,
-            'audioUrl': audio_url,
-            'sessionId': session_id,
-            'user_id': session.get('user_id')  # Add user ID
-        })
-        
-        # When saving transcript data, also save to user's collection
-        if 'user_id' in session:
-            transcript_data = {
-                'transcript': transcript,
-                'audioUrl': audio_url,
-                'summary': '',  # Initialize with empty summary
-                'transcript_id': session_id,  # Use the same session_id as transcript_id for consistency
-                "api_cost": session_costs[session_id].total_cost,
-                "total_token_count": session_costs[session_id].total_tokens,
-                "prompt_tokens": 0,  # Placeholder, update with actual prompt tokens
-                "response_tokens": 0,  # Placeholder, update with actual response tokens
-                "model_version": TRANSCRIPTION_MODEL
-            }
-            transcript_data.update(usage_metadata)
-            user_auth.save_user_transcript(session['user_id'], transcript_data)
-            # Record API call details in new collection (for tracking over all users)
-            # record_api_call(session['user_id'], "transcription", session_costs[session_id].total_tokens, 0, 0, TRANSCRIPTION_MODEL)
-            record_api_call(session['user_id'], "transcription",
-                usage_metadata['total_token_count'],
-                usage_metadata['prompt_tokens'],
-                usage_metadata['response_tokens'],
-                TRANSCRIPTION_MODEL
-            )
-        return response
-    except Exception as e:
-        logger.error(f"Error processing file: {str(e)}")
-        traceback.print_exc()
-        # Clean up on error
-        if os.path.exists(filepath):
-            os.remove(filepath)
-        return jsonify({'error': str(e)}), 500
+    job = get_user_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    return jsonify({
+        'jobId': job['job_id'],
+        'status': job['status'],
+        'stage': job['stage'],
+        'progress': job['progress'],
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'updated_at': job['updated_at']
+    })
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """Return the transcript produced by a finished transcription job."""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
+    
+    job = get_user_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['status'] == jobs.JOB_FAILED:
+        return jsonify({'error': job['error']}), 500
+    if job['status'] != jobs.JOB_DONE:
+        return jsonify({'status': job['status'], 'stage': job['stage'], 'progress': job['progress']}), 202
+    
+    result = job['result']
+    # Remember the transcript id in the session for later use in Q&A
+    transcript_ids = [t for t in session.get('transcript_ids', []) if t != result['sessionId']]
+    session['transcript_ids'] = (transcript_ids + [result['sessionId']])[-SESSION_TRANSCRIPT_IDS:]
+    logger.info(f"Transcript id stored in session: {result['sessionId']}")
+    return jsonify(result)
 
 # Add a cleanup route to periodically remove old cached files
 @app.route('/cleanup', methods=['POST'])
 def cleanup_cache():
-    """Admin route to clean up old cached audio files."""
+    """Admin route to shrink the audio cache to its quota (or to ?max_bytes=N)."""
     try:
-        # Get all files in the cache directory
-        files = os.listdir(app.config['AUDIO_CACHE'])
-        count = len(files)
-        
-        # Remove all files
-        for file in files:
-            file_path = os.path.join(app.config['AUDIO_CACHE'], file)
-            if os.path.isfile(file_path):
-                os.unlink(file_path)
-                
-        return jsonify({'message': f'Successfully cleaned up {count} files'})
+        max_bytes = request.args.get('max_bytes', type=int)
+        removed, freed = audio_cache_manager.evict(max_bytes)
+        return jsonify({
+            'message': f'Successfully cleaned up {removed} files',
+            'bytes_freed': freed,
+            'cache_bytes': audio_cache_manager.total_bytes()
+        })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/summarize', methods=['POST'])
 def summarize():
-    """Generate a summary of the transcript."""
+    """
+    Generate a summary of a transcript and attach it to the saved transcript.
+
+    The transcript is identified by sessionId (its transcript_id) and loaded
+    server-side; a raw transcript is only needed for transcripts that were never saved.
+    """
     logger.info("Summarize endpoint called")
     if 'user_id' not in session:
         return jsonify({'error': 'Authentication required'}), 401
     data = request.json
-    if not data or 'transcript' not in data:
+    if not data or not (data.get('sessionId') or data.get('transcript')):
         logger.warning("No transcript provided for summarization")
         return jsonify({'error': 'No transcript provided'}), 400
     
-    transcript = data['transcript']
+    user_id = session['user_id']
+    session_id = data.get('sessionId')
+    transcript = stored_transcripts.get(session_id, user_id) if session_id else None
+    if not transcript:
+        transcript = data.get('transcript')
+        if not transcript:
+            logger.warning(f"Transcript {session_id} not found for summarization")
+            return jsonify({'error': 'Transcript not found'}), 404
+    
+    bypass_cache = bool(data.get('bypassCache'))
     logger.info(f"Generating summary for transcript of length: {len(transcript)}")
-    response = generate_summary(transcript)
+    response = generate_summary(transcript, session_id, use_cache=not bypass_cache)
     summary = response['summary']
     usage_metadata = response['token_usage']
-    logger.info(f"Summary generated with token usage: {usage_metadata}")
+    logger.info(f"Summary generated with token usage: {usage_metadata} (cached: {response['cached']})")
     title = summary.split('\n')[0].replace('# ', '') if summary else "No title generated"
     logger.info(f"Generated summary title: {title}")
     logger.info("Summary generated successfully")
     
-    record_api_call(session['user_id'], "summarization",
-                usage_metadata['total_token_count'],
-                usage_metadata['prompt_tokens'],
-                usage_metadata['response_tokens'],
-                SUMMARY_MODEL
-            )
-    # Check if user is logged in and session ID is provided
-    if 'user_id' in session and 'sessionId' in data:
-        session_id = data['sessionId']
-        user_id = session.get('user_id')
-        
-        try:
-            # Update the transcript document with the summary
-            result = user_auth.transcripts_collection.update_one(
-                {
-                    'user_id': user_id,
-                    'transcript_id': session_id,
-                    "title": title
-                },
-                {
-                    '$set': {
-                        'summary': summary,
-                        'title': title
-                        }
-                }
-            )
-            
-            if result.matched_count > 0:
-                logger.info(f"Summary saved to database for session ID: {session_id}")
-            else:
-                # Try to find by the transcript content if session_id doesn't match transcript_id
-                result = user_auth.transcripts_collection.update_one(
-                    {
-                        'user_id': user_id,
-                        'transcript': transcript,
-
-                    },
-                    {
-                        '$set': {
-                            'summary': summary,
-                            'title': title,
-                            }
-                    }
-                )
-                if result.matched_count > 0:
-                    logger.info("Summary saved to database (matched by transcript content)")
-                else:
-                    logger.warning("Could not find matching transcript to update with summary")
-
-            # res = user_auth.update_transcript_title(
-            #     user_id=user_id,
-            #     transcript_id=session_id,
-            #     title=title
-            # )
-            # if res:
-            #     logger.info(f"Transcript title updated in database for session ID: {session_id}")
-            # else:
-            #     logger.warning(f"Failed to update transcript title in database for session ID: {session_id}")
-        except Exception as e:
-            logger.error(f"Error saving summary to database: {str(e)}")
+    record_response(user_id, "summarization", SUMMARY_MODEL, usage_metadata,
+                    cache_hit=None if bypass_cache else response['cached'])
+    
+    try:
+        # Attach the summary by id, or by content digest if the id is unknown
+        transcript_id = user_auth.attach_transcript_summary(
+            user_id, summary, title,
+            transcript_id=session_id, digest=user_auth.transcript_digest(transcript))
+        if transcript_id:
+            logger.info(f"Summary saved to database for transcript ID: {transcript_id}")
+        else:
+            logger.warning("Could not find matching transcript to update with summary")
+    except Exception as e:
+        logger.error(f"Error saving summary to database: {str(e)}")
     
     return jsonify({'summary': summary})
 
-@app.route('/ask_question', methods=['POST'])
-def ask_question():
-    """Answer a question about the transcript."""
-    logger.info("Ask question endpoint called")
+def get_question_request():
+    """Validate a question request; returns ((session_id, question, transcript, bypass_cache), None) or (None, error response)"""
     data = request.json
     if not data:
         logger.warning("No data provided to ask_question endpoint")
-        return jsonify({'error': 'No data provided'}), 400
+        return None, (jsonify({'error': 'No data provided'}), 400)
     
     if 'question' not in data:
         logger.warning("No question provided")
-        return jsonify({'error': 'No question provided'}), 400
+        return None, (jsonify({'error': 'No question provided'}), 400)
         
     if 'sessionId' not in data:
         logger.warning("No session ID provided")
-        return jsonify({'error': 'No session ID provided'}), 400
+        return None, (jsonify({'error': 'No session ID provided'}), 400)
     
     session_id = data['sessionId']
     question = data['question']
     logger.info(f"Processing question: '{question}' for session: {session_id}")
     
     # Get the stored transcript for this session
-    transcript = session.get(f'transcript_{session_id}')
+    transcript = stored_transcripts.get(session_id, session.get('user_id'))
     if not transcript:
         logger.warning(f"No transcript found for session ID: {session_id}")
         # Fallback to transcript provided in the request
         transcript = data.get('transcript', '')
         if not transcript:
             logger.error("No transcript found in session or request")
-            return jsonify({'error': 'Transcript not found'}), 404
+            return None, (jsonify({'error': 'Transcript not found'}), 404)
         else:
             logger.info("Using transcript provided in request as fallback")
     
-    response = answer_question(transcript, question)
+    return (session_id, question, transcript, bool(data.get('bypassCache'))), None
+
+def question_cache_key(transcript, question):
+    """Response cache key of a question about a transcript"""
+    return response_cache.make_key(QnA_MODEL, QA_PROMPT_VERSION, EMBEDDING_MODEL, RETRIEVAL_TOP_K,
+                                   transcript, question.strip())
+
+@app.route('/ask_question', methods=['POST'])
+def ask_question():
+    """Answer a question about the transcript."""
+    logger.info("Ask question endpoint called")
+    parsed, error = get_question_request()
+    if error:
+        return error
+    session_id, question, transcript, bypass_cache = parsed
+    user_id = session.get('user_id')
+    
+    cache_key = question_cache_key(transcript, question)
+    cached = None if bypass_cache else cached_responses.get(cache_key)
+    if cached:
+        logger.info("Question answered from the response cache")
+        record_response(user_id, "QandA", QnA_MODEL, cached['token_usage'], cache_hit=True)
+        return jsonify({'answer': cached['text'], 'cached': True})
+    
+    context = select_question_context(transcript, question, user_id, session_id, session_id)
+    response = answer_question(context, question, session_id)
     answer = response['response']
     usage_metadata = response['token_usage']
     logger.info(f"Answer generated with token usage: {usage_metadata}")
+    cached_responses.put(cache_key, answer, usage_metadata)
 
     logger.info("Question answered successfully")
 
-    record_api_call(session['user_id'], "QandA",
-                usage_metadata['total_token_count'],
-                usage_metadata['prompt_tokens'],
-                usage_metadata['response_tokens'],
-                QnA_MODEL
-            )
+    record_response(user_id, "QandA", QnA_MODEL, usage_metadata,
+                    cache_hit=None if bypass_cache else False)
     return jsonify({'answer': answer})
 
+@app.route('/ask_question/stream', methods=['POST'])
+def ask_question_stream():
+    """Answer a question about the transcript, streaming the answer as server-sent events."""
+    logger.info("Streaming ask question endpoint called")
+    parsed, error = get_question_request()
+    if error:
+        return error
+    session_id, question, transcript, bypass_cache = parsed
+    user_id = session.get('user_id')
+    cache_key = question_cache_key(transcript, question)
+    
+    def generate():
+        cached = None if bypass_cache else cached_responses.get(cache_key)
+        if cached:
+            logger.info("Question answered from the response cache")
+            record_response(user_id, "QandA", QnA_MODEL, cached['token_usage'], cache_hit=True)
+            yield server_sent_event({'text': cached['text']})
+            yield server_sent_event({'token_usage': cached['token_usage'], 'cached': True}, event='done')
+            return
+        
+        try:
+            context = select_question_context(transcript, question, user_id, session_id, session_id)
+            answer = []
+            for item in stream_answer(context, question):
+                if isinstance(item, str):
+                    answer.append(item)
+                    yield server_sent_event({'text': item})
+                    continue
+                
+                usage_metadata = item
+                logger.info(f"Streamed answer with token usage: {usage_metadata}")
+                cached_responses.put(cache_key, ''.join(answer), usage_metadata)
+                charge_session(session_id, "qa", QnA_MODEL, usage_metadata)
+                record_response(user_id, "QandA", QnA_MODEL, usage_metadata,
+                                cache_hit=None if bypass_cache else False)
+                yield server_sent_event({'token_usage': usage_metadata, 'cached': False}, event='done')
+        except Exception as e:
+            logger.error(f"Streaming question answering error: {str(e)}")
+            yield server_sent_event({'error': str(e)}, event='error')
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        # Stop proxies from buffering the stream
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 # For debugging - add a route to check session content
 @app.route('/debug/session', methods=['GET'])
 def debug_session():
     """Debug route to display session content."""
     logger.info("Debug session endpoint called")
     session_data = {}
-    for key in session:
-        if key.startswith('transcript_'):
-            session_id = key.split('_')[1]
-            transcript = session[key]
-            session_data[session_id] = {
-                'transcript_length': len(transcript),
-                'transcript_preview': transcript[:100] + '...' if len(transcript) > 100 else transcript
-            }
+    for session_id in session.get('transcript_ids', []):
+        transcript = stored_transcripts.get(session_id, session.get('user_id')) or ''
+        session_data[session_id] = {
+            'transcript_length': len(transcript),
+            'transcript_preview': transcript[:100] + '...' if len(transcript) > 100 else transcript
+        }
     return jsonify(session_data)
 
 # Add a route to get the current session's cost
 @app.route('/cost/<session_id>', methods=['GET'])
 def get_session_cost(session_id):
     """Get the cost information for a session."""
-    if session_id not in session_costs:
+    cost_summary = session_costs.get_summary(session_id)
+    if cost_summary is None:
         return jsonify({'error': 'Session not found'}), 404
     
-    cost_summary = session_costs[session_id].get_summary()
-    print(cost_summary)
     return jsonify(cost_summary)
 
+# Add a route to get token and cost totals by model for the current user
+@app.route('/usage/month', methods=['GET'])
+def get_monthly_usage():
+    """Get the current user's usage for a month (?month=YYYY-MM, default this month)."""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
+    
+    try:
+        month = datetime.datetime.strptime(request.args['month'], '%Y-%m') if 'month' in request.args \
+            else datetime.datetime.utcnow()
+    except ValueError:
+        return jsonify({'error': 'month must be formatted as YYYY-MM'}), 400
+    
+    start, end = usage_rollups.month_range(month.year, month.month)
+    usage = usage_rollups.get_usage(app.config['MONGO_DB'], session['user_id'], start, end)
+    usage['month'] = start.strftime('%Y-%m')
+    return jsonify(usage)
+
+# Add a route to get the transcript cache hit/miss counters for the current user
+@app.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Get transcript cache statistics for the logged in user."""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
+    
+    stats = transcript_cache.get_cache_stats(app.config['MONGO_DB'], session['user_id'])
+    return jsonify(stats)
+
 # Add a route to get rate limit status
 @app.route('/rate_limits', methods=['GET'])
 def get_rate_limits():
@@ -1097,14 +1448,19 @@ def logout():
 @app.route('/profile')
 @user_auth.login_required
 def profile():
-    """User profile page"""
+    """User profile page (one page of transcript previews, ?cursor= for older ones)"""
     user_id = session.get('user_id')
-    user_transcripts = user_auth.get_user_transcripts(user_id)
+    try:
+        user_transcripts, next_cursor = user_auth.get_user_transcript_page(
+            user_id, limit=TRANSCRIPT_PAGE_SIZE, cursor=request.args.get('cursor'))
+    except ValueError:
+        return redirect(url_for('profile'))
     
     return render_template('profile.html', 
                            username=session.get('username'),
                            email=session.get('email'),
-                           transcripts=user_transcripts)
+                           transcripts=user_transcripts,
+                           next_cursor=next_cursor)
 
 # Add a debug route to view session data
 @app.route('/debug/user_session')
@@ -1124,15 +1480,23 @@ def debug_user_session():
         })
 
 # Add new API routes for transcript management
+TRANSCRIPT_PAGE_SIZE = 50
+MAX_TRANSCRIPT_PAGE_SIZE = 200
+
 @app.route('/api/transcripts', methods=['GET'])
 @user_auth.login_required
 def get_user_transcripts_api():
-    """API endpoint to get all user transcripts"""
+    """API endpoint to get a page of user transcripts (?limit=&cursor=)"""
     user_id = session.get('user_id')
     if not user_id:
         return jsonify({'error': 'Not authenticated'}), 401
     
-    transcripts = user_auth.get_user_transcripts(user_id)
+    limit = min(max(request.args.get('limit', TRANSCRIPT_PAGE_SIZE, type=int), 1), MAX_TRANSCRIPT_PAGE_SIZE)
+    cursor = request.args.get('cursor')
+    try:
+        transcripts, next_cursor = user_auth.get_user_transcript_page(user_id, limit=limit, cursor=cursor)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
     
     # Convert MongoDB documents to JSON-serializable format
     result = []
@@ -1141,11 +1505,11 @@ def get_user_transcripts_api():
             'transcript_id': t.get('transcript_id', ''),
             'title': t.get('title', ''),
             'created_at': t.get('created_at').isoformat() if t.get('created_at') else None,
-            'has_summary': bool(t.get('summary')),
-            'preview': t.get('transcript', '')[:100] + '...' if len(t.get('transcript', '')) > 100 else t.get('transcript', '')
+            'has_summary': bool(t.get('has_summary')),
+            'preview': t.get('preview', '')
         })
     
-    return jsonify({'transcripts': result})
+    return jsonify({'transcripts': result, 'next_cursor': next_cursor})
 
 @app.route('/api/transcript/<transcript_id>', methods=['GET'])
 @user_auth.login_required
@@ -1204,6 +1568,7 @@ def delete_transcript(transcript_id):
     
     # Delete the transcript
     result = user_auth.delete_transcript(user_id, transcript_id)
+    stored_transcripts.invalidate(transcript_id, user_id)
     
     if result:
         return jsonify({'success': True})
@@ -0,0 +1,176 @@
+"""
+Byte-quota cache manager for the playback audio cache.
+
+Files in the cache directory are tracked in a small SQLite index (name, size, last
+access), so enforcing the quota is an indexed query instead of a stat() of every
+file. When the cache grows past its quota the least recently played files are
+removed, skipping anything played within the last few minutes.
+
+The directory is only scanned (once, with os.scandir) to reconcile the index with
+files added or removed behind its back.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+import logging
+from contextlib import closing
+
+logger = logging.getLogger('transcriber')
+
+
+class CacheManager:
+    """Track cached files and evict the least recently accessed ones beyond max_bytes."""
+
+    def __init__(self, directory, index_path, max_bytes, min_idle_seconds=600, touch_interval=60):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # Files accessed more recently than this are never evicted (they may be playing)
+        self.min_idle_seconds = min_idle_seconds
+        # Access times are only written once per touch_interval per file
+        self.touch_interval = touch_interval
+        self.index_path = index_path
+        self.recent_touches = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "name TEXT PRIMARY KEY, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS files_last_access ON files (last_access)")
+
+    def _connect(self):
+        # An autocommit connection closed after each operation; the index file is shared by every process
+        return closing(sqlite3.connect(self.index_path, timeout=30, isolation_level=None))
+
+    def add(self, name):
+        """
+        Record a file just written to the cache and wake the evictor if over quota.
+
+        Returns False, without recording anything, when the file is no longer there
+        (e.g. it was evicted after the caller checked for it).
+        """
+        try:
+            size = os.stat(os.path.join(self.directory, name)).st_size
+        except FileNotFoundError:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM files WHERE name = ?", (name,))
+            return False
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO files (name, size, last_access) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET size = excluded.size, last_access = excluded.last_access",
+                (name, size, time.time())
+            )
+        if self.total_bytes() > self.max_bytes:
+            self.wakeup.set()
+        return True
+
+    def touch(self, name):
+        """Mark a file as accessed (e.g. on playback)"""
+        now = time.time()
+        with self.lock:
+            if now - self.recent_touches.get(name, 0) < self.touch_interval:
+                return
+            self.recent_touches[name] = now
+            if len(self.recent_touches) > 10000:
+                self.recent_touches.clear()
+        with self._connect() as conn:
+            conn.execute("UPDATE files SET last_access = ? WHERE name = ?", (now, name))
+
+    def total_bytes(self):
+        """Total size of the tracked files"""
+        with self._connect() as conn:
+            return conn.execute("SELECT COALESCE(SUM(size), 0) FROM files").fetchone()[0]
+
+    def reconcile(self):
+        """Scan the directory once and bring the index in line with the files on disk"""
+        with self._connect() as conn:
+            known = {name: size for name, size in conn.execute("SELECT name, size FROM files")}
+        on_disk = set()
+        added = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                # Skip files still being written by segmenter.encode_playback
+                if not entry.is_file() or '.tmp.' in entry.name:
+                    continue
+                on_disk.add(entry.name)
+                if entry.name not in known:
+                    stat = entry.stat()
+                    # Untracked files count as last accessed when they were written
+                    added.append((entry.name, stat.st_size, stat.st_mtime))
+        missing = [(name,) for name in known if name not in on_disk]
+        with self._connect() as conn:
+            conn.execute("BEGIN")
+            conn.executemany("INSERT OR IGNORE INTO files (name, size, last_access) VALUES (?, ?, ?)", added)
+            conn.executemany("DELETE FROM files WHERE name = ?", missing)
+            conn.execute("COMMIT")
+        logger.info(f"Audio cache index reconciled: {len(added)} added, {len(missing)} dropped")
+        return len(added), len(missing)
+
+    def evict(self, max_bytes=None):
+        """
+        Remove least recently accessed files until the cache fits in max_bytes.
+
+        Returns (files removed, bytes freed).
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        excess = self.total_bytes() - max_bytes
+        removed = freed = 0
+        if excess <= 0:
+            return removed, freed
+
+        cutoff = time.time() - self.min_idle_seconds
+        with self._connect() as conn:
+            candidates = conn.execute(
+                "SELECT name, size FROM files WHERE last_access < ? ORDER BY last_access", (cutoff,)
+            )
+            for name, size in candidates.fetchall():
+                if freed >= excess:
+                    break
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.error(f"Failed to evict {name} from the audio cache: {str(e)}")
+                    continue
+                conn.execute("DELETE FROM files WHERE name = ?", (name,))
+                removed += 1
+                freed += size
+        logger.info(f"Evicted {removed} files ({freed} bytes) from the audio cache")
+        return removed, freed
+
+    def start(self, check_interval=300):
+        """Reconcile once, then evict in a background thread whenever the quota is exceeded"""
+        self.reconcile()
+        self.thread = threading.Thread(target=self._run, args=(check_interval,), name='audio-cache', daemon=True)
+        self.thread.start()
+
+    def _run(self, check_interval):
+        while not self.stopped.is_set():
+            # Woken early by add(); the timeout covers files touched out-of-quota by other processes
+            self.wakeup.wait(check_interval)
+            self.wakeup.clear()
+            try:
+                self.evict()
+            except Exception as e:
+                logger.error(f"Audio cache eviction failed: {str(e)}")
+
+    def stop(self):
+        self.stopped.set()
+        self.wakeup.set()
+
+
+def create_cache_manager(directory, index_path=None):
+    """Create a CacheManager from the AUDIO_CACHE_* environment settings"""
+    return CacheManager(
+        directory,
+        index_path or os.environ.get('AUDIO_CACHE_INDEX', 'audio_cache.db'),
+        max_bytes=int(os.environ.get('AUDIO_CACHE_MAX_BYTES', 5 * 1024 ** 3)),
+        min_idle_seconds=int(os.environ.get('AUDIO_CACHE_MIN_IDLE_SECONDS', 600))
+    )
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""
+Round-trip benchmark for dump_db.py.
+
+Seeds a scratch database with production-sized users, transcripts and api_calls,
+dumps it with one worker and with several (so large collections are split into
+_id ranges), restores the dump into a second scratch database and checks every
+document came back:
+
+    python bench_dump_db.py --transcripts 20000 --workers 8
+
+Connects with dump_db's MONGO_URI. Both scratch databases and the dump directory
+are removed afterwards.
+"""
+
+import os
+import time
+import uuid
+import shutil
+import datetime
+import tempfile
+
+import click
+
+import dump_db
+
+
+def seed(db, users, transcripts, api_calls, transcript_chars, batch_size=1000):
+    """Insert synthetic documents shaped like the app's"""
+    now = datetime.datetime.utcnow()
+    user_ids = [str(uuid.uuid4()) for _ in range(users)]
+    db.users.insert_many([{
+        'username': f"bench-user-{i}", 'email': f"bench-{i}@example.com",
+        'password_hash': os.urandom(32), 'salt': os.urandom(16),
+        'user_id': user_id, 'created_at': now, 'sessions': []
+    } for i, user_id in enumerate(user_ids)])
+
+    line = "Speaker 1: a representative line of transcribed speech for the benchmark.\n"
+    text = line * (transcript_chars // len(line) + 1)
+    for start in range(0, transcripts, batch_size):
+        db.transcripts.insert_many([{
+            'user_id': user_ids[i % users], 'transcript_id': f"bench-{i}",
+            'transcript': text[:transcript_chars], 'preview': text[:200], 'title': f"Transcript {i}",
+            'created_at': now - datetime.timedelta(minutes=i)
+        } for i in range(start, min(start + batch_size, transcripts))])
+
+    for start in range(0, api_calls, batch_size):
+        db.api_calls.insert_many([{
+            'user_id': user_ids[i % users], 'request_type': 'transcription', 'model': 'gemini-2.0-flash',
+            'input_tokens': 1000 + i % 500, 'output_tokens': 200 + i % 100, 'timestamp': now
+        } for i in range(start, min(start + batch_size, api_calls))])
+
+
+def directory_bytes(directory):
+    with os.scandir(directory) as entries:
+        return sum(entry.stat().st_size for entry in entries if entry.is_file())
+
+
+@click.command()
+@click.option('--users', default=1000, type=int, show_default=True)
+@click.option('--transcripts', default=20000, type=int, show_default=True)
+@click.option('--api-calls', default=200000, type=int, show_default=True)
+@click.option('--transcript-chars', default=20000, type=int, show_default=True, help='Characters per transcript')
+@click.option('--workers', default=dump_db.DUMP_WORKERS, type=int, show_default=True,
+              help='Workers for the parallel run')
+@click.option('--compression', type=click.Choice(dump_db.COMPRESSION_CHOICES), default='gzip',
+              show_default=True)
+@click.option('--database', default='transcriber_dump_bench', help='Scratch database prefix (dropped afterwards)')
+def main(users, transcripts, api_calls, transcript_chars, workers, compression, database):
+    """Time a dump and restore of a seeded database, sequential vs parallel"""
+    source = dump_db.client[database]
+    target = dump_db.client[f"{database}_restore"]
+    output_dir = tempfile.mkdtemp(prefix='dump_bench_')
+    # Ranges are sized for the seeded data, so the parallel run splits the large collections
+    dump_db.RANGE_DOCUMENTS = max(1, min(transcripts, api_calls) // workers)
+
+    try:
+        started = time.perf_counter()
+        seed(source, users, transcripts, api_calls, transcript_chars)
+        expected = {name: source[name].estimated_document_count() for name in dump_db.EXPORT_COLLECTIONS}
+        click.echo(f"Seeded {expected} in {time.perf_counter() - started:.1f}s")
+
+        click.echo(f"{'step':<28} {'workers':>7} {'seconds':>8} {'docs/s':>10} {'MB':>8}")
+        total = sum(expected.values())
+        for run_workers in sorted({1, workers}):
+            shutil.rmtree(output_dir, ignore_errors=True)
+            started = time.perf_counter()
+            if not dump_db.dump_db_to_json(output_dir, anonymize=False, compression=compression,
+                                           workers=run_workers, db=source):
+                raise click.ClickException("Dump failed")
+            elapsed = time.perf_counter() - started
+            click.echo(f"{'dump':<28} {run_workers:>7} {elapsed:>8.2f} {total / elapsed:>10.0f} "
+                       f"{directory_bytes(output_dir) / 1e6:>8.1f}")
+
+        for run_workers in sorted({1, workers}):
+            started = time.perf_counter()
+            counts = dump_db.restore_db(output_dir, drop=True, workers=run_workers, db=target)
+            elapsed = time.perf_counter() - started
+            click.echo(f"{'restore (insert_many)':<28} {run_workers:>7} {elapsed:>8.2f} {total / elapsed:>10.0f}")
+            if counts != {name: count for name, count in expected.items() if count}:
+                raise click.ClickException(f"Restored {counts}, expected {expected}")
+        click.echo("Round trip complete: every document restored")
+    finally:
+        dump_db.client.drop_database(source.name)
+        dump_db.client.drop_database(target.name)
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+"""
+Latency benchmark for the user_auth persistence layer.
+
+Runs each write path the app uses against a scratch database, once with the old
+read-then-write implementation and once with the current single-round-trip one, and
+reports MongoDB round-trips and latency per operation:
+
+    python bench_user_auth.py --iterations 200
+
+Connects with the same MONGO_* environment variables as the app (e.g. the mongodb
+service from docker-compose.yml). The scratch database is dropped afterwards.
+"""
+
+import time
+import uuid
+import datetime
+import statistics
+
+import click
+from pymongo import monitoring
+
+
+class RoundTripCounter(monitoring.CommandListener):
+    """Count commands sent to MongoDB"""
+
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+# Registered before user_auth creates its client so every command is counted
+counter = RoundTripCounter()
+monitoring.register(counter)
+
+import user_auth  # noqa: E402
+
+
+def legacy_save_user_transcript(user_id, transcript_data):
+    """Previous implementation: find_one, then update_one or insert_one"""
+    transcript = {
+        'user_id': user_id,
+        'transcript': transcript_data.get('transcript', ''),
+        'created_at': datetime.datetime.utcnow(),
+        'transcript_id': transcript_data['transcript_id'],
+        'title': transcript_data.get('title', ''),
+    }
+    existing = user_auth.transcripts_collection.find_one({
+        'user_id': user_id,
+        'transcript_id': transcript['transcript_id']
+    })
+    if existing:
+        transcript['created_at'] = existing['created_at']
+        user_auth.transcripts_collection.update_one({'_id': existing['_id']}, {'$set': transcript})
+        return str(existing['_id'])
+    return str(user_auth.transcripts_collection.insert_one(transcript).inserted_id)
+
+
+def legacy_update_transcript_title(user_id, transcript_id, title):
+    """Previous implementation: find_one, then update_one"""
+    existing = user_auth.transcripts_collection.find_one({'user_id': user_id, 'transcript_id': transcript_id})
+    if not existing:
+        return False
+    if existing.get('title') == title:
+        return True
+    user_auth.transcripts_collection.update_one(
+        {'user_id': user_id, 'transcript_id': transcript_id}, {'$set': {'title': title}})
+    return True
+
+
+def legacy_register_user(username, email, password):
+    """Previous implementation: duplicate check, then insert_one"""
+    if user_auth.users_collection.find_one({'$or': [{'username': username}, {'email': email}]}):
+        return False, "Username or email already exists"
+    password_hash, salt = user_auth.hash_password(password)
+    user_auth.users_collection.insert_one({
+        'username': username, 'email': email, 'password_hash': password_hash, 'salt': salt,
+        'user_id': str(uuid.uuid4()), 'created_at': datetime.datetime.utcnow(), 'sessions': []
+    })
+    return True, "User registered successfully"
+
+
+def measure(func, args_list):
+    """Run func over args_list; return (round-trips per call, p50 ms, p95 ms)"""
+    latencies = []
+    start_count = counter.count
+    for args in args_list:
+        started = time.perf_counter()
+        func(*args)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return (
+        (counter.count - start_count) / len(args_list),
+        statistics.median(latencies),
+        latencies[int(len(latencies) * 0.95) - 1]
+    )
+
+
+def transcript(user_id, i, tag):
+    return {'transcript_id': f"{tag}-{i}", 'transcript': f"Speaker 1: benchmark transcript {i}\n" * 20}
+
+
+@click.command()
+@click.option('--iterations', default=200, type=int, help='Calls per operation')
+@click.option('--database', default='transcriber_bench', help='Scratch database (dropped afterwards)')
+def main(iterations, database):
+    """Compare round-trips and latency of the old and new write paths"""
+    bench_db = user_auth.client[database]
+    user_auth.transcripts_collection = bench_db.transcripts
+    user_auth.users_collection = bench_db.users
+    user_auth.db_indexes.ensure_indexes(bench_db)
+    user_id = 'bench-user'
+
+    def transcripts(tag):
+        return [(user_id, transcript(user_id, i, tag)) for i in range(iterations)]
+
+    # (description, old implementation, new implementation, arguments per call for an id prefix);
+    # the update and rename runs reuse the documents the insert run created
+    operations = [
+        ("save transcript (insert) /transcribe",
+         legacy_save_user_transcript, user_auth.save_user_transcript, transcripts),
+        ("save transcript (update) /transcribe",
+         legacy_save_user_transcript, user_auth.save_user_transcript, transcripts),
+        ("rename PUT /api/transcript/<id>/title",
+         legacy_update_transcript_title, user_auth.update_transcript_title,
+         lambda tag: [(user_id, f"{tag}-{i}", f"Title {i}") for i in range(iterations)]),
+        ("sign up POST /signup",
+         legacy_register_user, user_auth.register_user,
+         lambda tag: [(f"{tag}-user-{i}", f"{tag}-{i}@example.com", 'password') for i in range(iterations)]),
+    ]
+
+    try:
+        click.echo(f"{'operation':<50} {'impl':<7} {'trips':>6} {'p50 ms':>8} {'p95 ms':>8}")
+        for description, legacy_func, new_func, arguments in operations:
+            for tag, func in (('legacy', legacy_func), ('new', new_func)):
+                trips, p50, p95 = measure(func, arguments(tag))
+                click.echo(f"{description:<50} {tag:<7} {trips:>6.1f} {p50:>8.2f} {p95:>8.2f}")
+    finally:
+        user_auth.client.drop_database(database)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,22 @@
 #!/usr/bin/env python
+"""
+Keep the audio cache under its byte quota and clear stale uploads.
+
+The audio cache is shrunk through the same index the app uses (see audio_cache.py),
+evicting the least recently played files first:
+
+    python cleanup.py
+    python cleanup.py --max-bytes 1000000000 --reconcile
+"""
+
 import os
 import time
 import logging
 
+import click
+
+import audio_cache
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -11,40 +25,49 @@ logging.basicConfig(
 
 CACHE_DIR = 'audio_cache'
 UPLOADS_DIR = 'uploads'
-MAX_AGE_HOURS = 24
+UPLOADS_MAX_AGE_HOURS = 1
 
 def cleanup_old_files(directory, max_age_hours):
     """Remove files older than max_age_hours from the specified directory."""
     if not os.path.exists(directory):
         logging.warning(f"Directory does not exist: {directory}")
         return 0
-    
+
     count = 0
-    current_time = time.time()
-    max_age_seconds = max_age_hours * 3600
-    
-    for filename in os.listdir(directory):
-        filepath = os.path.join(directory, filename)
-        if os.path.isfile(filepath):
-            file_age = current_time - os.path.getctime(filepath)
-            if file_age > max_age_seconds:
+    cutoff = time.time() - max_age_hours * 3600
+
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
                 try:
-                    os.remove(filepath)
+                    os.remove(entry.path)
                     count += 1
                 except Exception as e:
-                    logging.error(f"Failed to remove {filepath}: {str(e)}")
-    
+                    logging.error(f"Failed to remove {entry.path}: {str(e)}")
+
     return count
 
-if __name__ == "__main__":
+@click.command()
+@click.option('--max-bytes', type=int, default=None, help='Cache size to shrink to (default: AUDIO_CACHE_MAX_BYTES)')
+@click.option('--reconcile', is_flag=True, help='Rescan the cache directory for files missing from the index')
+@click.option('--uploads-max-age-hours', default=UPLOADS_MAX_AGE_HOURS, type=float, show_default=True,
+              help='Remove uploads older than this')
+def main(max_bytes, reconcile, uploads_max_age_hours):
+    """Evict least recently played audio beyond the cache quota and remove stale uploads"""
     logging.info("Starting cleanup process...")
-    
-    # Clean up audio cache
-    count_cache = cleanup_old_files(CACHE_DIR, MAX_AGE_HOURS)
-    logging.info(f"Removed {count_cache} old files from {CACHE_DIR}")
-    
+
+    manager = audio_cache.create_cache_manager(CACHE_DIR)
+    if reconcile:
+        manager.reconcile()
+    removed, freed = manager.evict(max_bytes)
+    logging.info(f"Removed {removed} files ({freed} bytes) from {CACHE_DIR}; "
+                 f"{manager.total_bytes()} bytes remain")
+
     # Clean up uploads folder (should be empty, but check just in case)
-    count_uploads = cleanup_old_files(UPLOADS_DIR, 1)  # More aggressive cleanup for uploads
+    count_uploads = cleanup_old_files(UPLOADS_DIR, uploads_max_age_hours)
     logging.info(f"Removed {count_uploads} old files from {UPLOADS_DIR}")
-    
+
     logging.info("Cleanup complete!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+"""
+Index definitions for the transcriber MongoDB collections.
+
+ensure_indexes() is called at startup so every hot query has an index behind it.
+Run this file directly to create the indexes or to explain() the hot queries and
+flag any that fall back to a collection scan:
+
+    python db_indexes.py create
+    python db_indexes.py explain
+"""
+
+import os
+import datetime
+import logging
+
+import click
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger('transcriber')
+
+# Days of raw api_calls documents kept before MongoDB expires them
+API_CALLS_RETENTION_DAYS = int(os.environ.get('API_CALLS_RETENTION_DAYS', 365))
+# Days a cached transcript is kept before MongoDB expires it
+TRANSCRIPT_CACHE_TTL_DAYS = int(os.environ.get('TRANSCRIPT_CACHE_TTL_DAYS', 30))
+# Days a cached partial (chunk) summary is kept
+SUMMARY_PARTIALS_TTL_DAYS = int(os.environ.get('SUMMARY_PARTIALS_TTL_DAYS', 30))
+# Days a cached summary or answer is kept
+RESPONSE_CACHE_TTL_DAYS = int(os.environ.get('RESPONSE_CACHE_TTL_DAYS', 7))
+# Days a session's cost summary is kept after its last request
+SESSION_COSTS_TTL_DAYS = int(os.environ.get('SESSION_COSTS_TTL_DAYS', 7))
+
+# collection -> list of (keys, options)
+INDEXES = {
+    'users': [
+        ([('email', ASCENDING)], {'unique': True}),
+        ([('username', ASCENDING)], {'unique': True}),
+        ([('user_id', ASCENDING)], {'unique': True}),
+    ],
+    'transcripts': [
+        ([('user_id', ASCENDING), ('transcript_id', ASCENDING)], {'unique': True}),
+        # Newest-first listing of a user's transcripts
+        ([('user_id', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)], {}),
+        ([('transcript_id', ASCENDING)], {}),
+        # Attaching summaries to a transcript identified by its content
+        ([('user_id', ASCENDING), ('digest', ASCENDING), ('created_at', DESCENDING)], {}),
+    ],
+    'api_calls': [
+        ([('user_id', ASCENDING), ('datetime', DESCENDING)], {}),
+        ([('datetime', ASCENDING)], {'expireAfterSeconds': API_CALLS_RETENTION_DAYS * 86400}),
+    ],
+    'usage_rollups': [
+        ([('user_id', ASCENDING), ('granularity', ASCENDING), ('bucket', ASCENDING), ('model', ASCENDING),
+          ('price_version', ASCENDING)], {'unique': True}),
+    ],
+    'transcript_cache': [
+        ([('content_hash', ASCENDING), ('model', ASCENDING), ('prompt_version', ASCENDING)], {'unique': True}),
+        ([('created_at', ASCENDING)], {'expireAfterSeconds': TRANSCRIPT_CACHE_TTL_DAYS * 86400}),
+    ],
+    'summary_partials': [
+        ([('created_at', ASCENDING)], {'expireAfterSeconds': SUMMARY_PARTIALS_TTL_DAYS * 86400}),
+    ],
+    'response_cache': [
+        ([('created_at', ASCENDING)], {'expireAfterSeconds': RESPONSE_CACHE_TTL_DAYS * 86400}),
+    ],
+    'session_costs': [
+        ([('updated_at', ASCENDING)], {'expireAfterSeconds': SESSION_COSTS_TTL_DAYS * 86400}),
+    ],
+    'transcript_cache_stats': [
+        ([('user_id', ASCENDING)], {'unique': True}),
+    ],
+}
+
+# Collections whose unique indexes the app relies on (register_user has no duplicate lookup)
+REQUIRED_UNIQUE_INDEXES = {'users'}
+
+# collection -> names of indexes replaced by the ones above, dropped by ensure_indexes
+RETIRED_INDEXES = {
+    # Unique bucket key before the price version was part of it
+    'usage_rollups': ['user_id_1_granularity_1_bucket_1_model_1'],
+}
+
+# Hot queries from the app: (description, collection, filter, sort)
+HOT_QUERIES = [
+    ("login by email", 'users', {'email': 'user@example.com'}, None),
+    ("transcript by user and id", 'transcripts', {'user_id': 'u', 'transcript_id': 't'}, None),
+    ("transcript by digest", 'transcripts', {'user_id': 'u', 'digest': 'd'}, [('created_at', -1)]),
+    ("transcript listing", 'transcripts', {'user_id': 'u'}, [('created_at', -1), ('_id', -1)]),
+    ("rollup rebuild day", 'api_calls',
+     {'datetime': {'$gte': datetime.datetime(2025, 1, 1), '$lt': datetime.datetime(2025, 1, 2)}}, None),
+    ("monthly usage", 'usage_rollups',
+     {'user_id': 'u', 'granularity': 'day', 'bucket': {'$gte': datetime.datetime(2025, 1, 1)}}, None),
+    ("transcript cache lookup", 'transcript_cache',
+     {'content_hash': 'h', 'model': 'm', 'prompt_version': 'v1'}, None),
+]
+
+
+def ensure_indexes(db):
+    """
+    Create every declared index.
+
+    Failures are logged so startup is not blocked, except for a unique index on a
+    REQUIRED_UNIQUE_INDEXES collection: without it duplicate accounts could be created,
+    so the error is raised and startup fails.
+    """
+    for collection, names in RETIRED_INDEXES.items():
+        existing = db[collection].index_information()
+        for name in names:
+            if name in existing:
+                db[collection].drop_index(name)
+    for collection, indexes in INDEXES.items():
+        for keys, options in indexes:
+            try:
+                db[collection].create_index(keys, **options)
+            except OperationFailure as e:
+                # e.g. duplicates blocking a unique index, or an existing index with other options
+                logger.error(f"Could not create index {keys} on {collection}: {e}")
+                if options.get('unique') and collection in REQUIRED_UNIQUE_INDEXES:
+                    raise
+
+
+def find_stages(plan):
+    """Yield every stage name in an explain() plan tree"""
+    if not isinstance(plan, dict):
+        return
+    if 'stage' in plan:
+        yield plan['stage']
+    for key in ('inputStage', 'queryPlan'):
+        if key in plan:
+            yield from find_stages(plan[key])
+    for child in plan.get('inputStages', []):
+        yield from find_stages(child)
+
+
+def audit_queries(db):
+    """Explain each hot query and return a list of (description, stages, is_collscan)"""
+    results = []
+    for description, collection, query, sort in HOT_QUERIES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.explain().get('queryPlanner', {}).get('winningPlan', {})
+        stages = list(find_stages(plan))
+        results.append((description, stages, 'COLLSCAN' in stages))
+    return results
+
+
+@click.group()
+def cli():
+    """Manage indexes for the Transcriber MongoDB collections"""
+
+
+@cli.command()
+def create():
+    """Create all declared indexes"""
+    import user_auth
+    ensure_indexes(user_auth.db)
+    click.echo("Indexes created")
+
+
+@cli.command()
+def explain():
+    """Explain the hot queries and flag collection scans"""
+    import user_auth
+    collscans = 0
+    for description, stages, is_collscan in audit_queries(user_auth.db):
+        marker = 'COLLSCAN' if is_collscan else 'ok'
+        click.echo(f"[{marker:>8}] {description}: {' <- '.join(stages)}")
+        collscans += is_collscan
+    if collscans:
+        raise SystemExit(f"{collscans} hot queries scan a whole collection")
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,180 @@
+"""
+Background job queue for long-running transcription work.
+
+Jobs are persisted in a local SQLite database so their status can be polled from
+any request thread, and executed on a bounded thread pool. Each job records the
+process that queued it; jobs left queued or running by a process that no longer
+exists (e.g. a restarted worker) are marked failed when a queue starts.
+"""
+
+import os
+import json
+import uuid
+import socket
+import sqlite3
+import datetime
+import contextlib
+import threading
+import traceback
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger('transcriber')
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+# Error stored on jobs whose worker process went away before they finished
+JOB_INTERRUPTED_ERROR = 'Interrupted by a server restart, please upload the file again'
+
+
+def process_owner():
+    """Identify this process as the owner of the jobs it queues"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def owner_alive(owner):
+    """Whether the process that owns a job may still be running it"""
+    if not owner:
+        return False
+    host, _, pid = owner.rpartition(':')
+    if host != socket.gethostname():
+        # Another machine's process can't be checked from here
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, ValueError):
+        return True
+    return True
+
+
+class JobStore:
+    """SQLite-backed store for job status, progress and results."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    user_id TEXT,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    progress REAL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if 'owner' not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """Open a connection for one transaction (committed on success) and close it afterwards"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def create(self, user_id):
+        """Create a new queued job and return its id"""
+        job_id = uuid.uuid4().hex
+        now = datetime.datetime.utcnow().isoformat()
+        with self.lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, user_id, status, stage, progress, owner, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, 0, ?, ?, ?)",
+                (job_id, user_id, JOB_QUEUED, JOB_QUEUED, process_owner(), now, now)
+            )
+        return job_id
+
+    def fail_orphaned(self):
+        """Mark queued or running jobs whose owning process is gone as failed; returns how many"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT job_id, owner FROM jobs WHERE status IN (?, ?)", (JOB_QUEUED, JOB_RUNNING)
+            ).fetchall()
+        orphaned = [job_id for job_id, owner in rows if not owner_alive(owner)]
+        for job_id in orphaned:
+            self.update(job_id, status=JOB_FAILED, error=JOB_INTERRUPTED_ERROR)
+        if orphaned:
+            logger.warning(f"Marked {len(orphaned)} interrupted jobs as failed")
+        return len(orphaned)
+
+    def update(self, job_id, **fields):
+        """Update status, stage, progress, result or error for a job"""
+        if 'result' in fields and fields['result'] is not None:
+            fields['result'] = json.dumps(fields['result'])
+        fields['updated_at'] = datetime.datetime.utcnow().isoformat()
+        columns = ", ".join(f"{key} = ?" for key in fields)
+        with self.lock, self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE job_id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id):
+        """Return the job as a dict, or None if it does not exist"""
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+
+class JobQueue:
+    """Run job functions on a bounded worker pool and track them in a JobStore."""
+
+    def __init__(self, store, max_workers=2):
+        self.store = store
+        # Clients polling jobs of a previous (crashed or restarted) process get an error instead of waiting forever
+        self.store.fail_orphaned()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+
+    def submit(self, user_id, func, *args, **kwargs):
+        """
+        Queue func(*args, progress=..., **kwargs) and return the job id.
+
+        The function receives a progress(stage, fraction) callback and its return
+        value is stored as the job result.
+        """
+        job_id = self.store.create(user_id)
+        self.executor.submit(self._run, job_id, func, args, kwargs)
+        return job_id
+
+    def _run(self, job_id, func, args, kwargs):
+        def progress(stage, fraction=None):
+            fields = {'stage': stage}
+            if fraction is not None:
+                fields['progress'] = round(fraction, 3)
+            self.store.update(job_id, **fields)
+
+        self.store.update(job_id, status=JOB_RUNNING, stage='starting')
+        try:
+            result = func(*args, progress=progress, **kwargs)
+            self.store.update(job_id, status=JOB_DONE, stage=JOB_DONE, progress=1.0, result=result)
+            logger.info(f"Job {job_id} completed")
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {str(e)}")
+            traceback.print_exc()
+            self.store.update(job_id, status=JOB_FAILED, error=str(e))
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+
+def create_job_queue(db_path=None, max_workers=None):
+    """Create a JobQueue from the JOBS_DB / JOB_WORKERS environment settings"""
+    db_path = db_path or os.environ.get('JOBS_DB', 'jobs.db')
+    max_workers = max_workers or int(os.environ.get('JOB_WORKERS', 2))
+    return JobQueue(JobStore(db_path), max_workers=max_workers)
@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+"""
+One-off data migrations for the transcriber MongoDB collections.
+
+Each migration scans the documents written before a field existed, so it is run once
+after upgrading instead of on every app start:
+
+    python migrations.py backfill
+"""
+
+import click
+
+
+@click.group()
+def cli():
+    """Run one-off data migrations"""
+
+
+@cli.command()
+def backfill():
+    """Add the preview, has_summary and digest fields to older transcripts"""
+    import user_auth
+    user_auth.backfill_transcript_previews()
+    user_auth.backfill_transcript_digests()
+    click.echo("Transcripts backfilled")
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,195 @@
+"""
+Token-bucket rate limiting for Gemini API calls.
+
+Each model has two buckets: one for requests per minute and one for tokens per
+minute. Checks are O(1) and the bucket state can live in memory (single process)
+or in a SQLite file shared by every worker process on the host.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+import logging
+from contextlib import closing
+
+logger = logging.getLogger('transcriber')
+
+
+class MemoryBucketStore:
+    """Bucket state kept in the current process."""
+
+    def __init__(self):
+        self.states = {}
+        self.lock = threading.Lock()
+
+    def update(self, keys, func):
+        """
+        Atomically apply func to the states of keys.
+
+        func receives {key: (tokens, updated_at) or None} and returns
+        (new_states, result); new_states are written back and result is returned.
+        """
+        with self.lock:
+            new_states, result = func({key: self.states.get(key) for key in keys})
+            self.states.update(new_states)
+            return result
+
+
+class SQLiteBucketStore:
+    """Bucket state in a SQLite file so several worker processes share one budget."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        # Autocommit so we control transactions explicitly; closed after each update
+        return closing(sqlite3.connect(self.db_path, timeout=30, isolation_level=None))
+
+    def update(self, keys, func):
+        with self._connect() as conn:
+            # BEGIN IMMEDIATE takes the write lock up front so read-modify-write is atomic across processes
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                placeholders = ", ".join("?" for _ in keys)
+                rows = conn.execute(
+                    f"SELECT key, tokens, updated_at FROM buckets WHERE key IN ({placeholders})", keys
+                ).fetchall()
+                states = {key: None for key in keys}
+                states.update({key: (tokens, updated_at) for key, tokens, updated_at in rows})
+                new_states, result = func(states)
+                conn.executemany(
+                    "INSERT INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                    [(key, tokens, updated_at) for key, (tokens, updated_at) in new_states.items()]
+                )
+                conn.execute("COMMIT")
+                return result
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute token buckets per model."""
+
+    def __init__(self, limits, store=None, default_limits=None):
+        self.limits = limits
+        self.default_limits = default_limits or {"requests_per_minute": 10, "tokens_per_minute": 1_000_000}
+        self.store = store or MemoryBucketStore()
+
+    def _capacities(self, model):
+        model_limits = self.limits.get(model, self.default_limits)
+        return (
+            model_limits.get("requests_per_minute", self.default_limits["requests_per_minute"]),
+            model_limits.get("tokens_per_minute", self.default_limits["tokens_per_minute"])
+        )
+
+    @staticmethod
+    def _refill(state, capacity, now):
+        """Return the bucket level at time now (buckets refill capacity tokens per minute)."""
+        if state is None:
+            return capacity
+        tokens, updated_at = state
+        return min(capacity, tokens + (now - updated_at) * capacity / 60.0)
+
+    def try_acquire(self, model, tokens=0):
+        """
+        Take one request and `tokens` tokens from the model's buckets if both have room.
+
+        Returns 0 when acquired, otherwise the number of seconds until they will.
+        """
+        rpm, tpm = self._capacities(model)
+        # A single call larger than the whole minute budget could never be satisfied
+        tokens = min(tokens, tpm)
+        keys = [f"{model}:requests", f"{model}:tokens"]
+
+        def take(states):
+            now = time.time()
+            requests_left = self._refill(states[keys[0]], rpm, now)
+            tokens_left = self._refill(states[keys[1]], tpm, now)
+            if requests_left >= 1 and tokens_left >= tokens:
+                return {keys[0]: (requests_left - 1, now), keys[1]: (tokens_left - tokens, now)}, 0.0
+            wait = max(
+                (1 - requests_left) * 60.0 / rpm if requests_left < 1 else 0.0,
+                (tokens - tokens_left) * 60.0 / tpm if tokens_left < tokens else 0.0
+            )
+            return {}, wait
+
+        return self.store.update(keys, take)
+
+    def acquire(self, model, tokens=0, timeout=None):
+        """Block until the buckets allow the call; raise if it would take longer than timeout."""
+        deadline = time.time() + timeout if timeout is not None else None
+        while True:
+            wait = self.try_acquire(model, tokens)
+            if wait <= 0:
+                return
+            if deadline is not None and time.time() + wait > deadline:
+                raise Exception(f"Rate limit exceeded for {model}: would need to wait {wait:.1f}s")
+            logger.info(f"Rate limit reached for {model}. Waiting {wait:.1f}s")
+            time.sleep(wait)
+
+    def record_usage(self, model, actual_tokens, reserved_tokens=0):
+        """Charge (or refund) the difference between the tokens reserved and actually used."""
+        _, tpm = self._capacities(model)
+        key = f"{model}:tokens"
+
+        def adjust(states):
+            now = time.time()
+            level = self._refill(states[key], tpm, now) - (actual_tokens - reserved_tokens)
+            return {key: (min(tpm, level), now)}, None
+
+        self.store.update([key], adjust)
+
+    def cooldown(self, model, seconds):
+        """Drain the request bucket so no calls are allowed for `seconds` (e.g. after a 429)."""
+        rpm, _ = self._capacities(model)
+        key = f"{model}:requests"
+
+        def drain(states):
+            now = time.time()
+            # Bucket refills at rpm/60 per second, so this level reaches 1 after `seconds`;
+            # never shorten a wait that is already longer
+            level = min(self._refill(states[key], rpm, now), 1 - seconds * rpm / 60.0)
+            return {key: (level, now)}, None
+
+        self.store.update([key], drain)
+
+    def get_status(self, model):
+        """Get current rate limit status."""
+        rpm, tpm = self._capacities(model)
+        keys = [f"{model}:requests", f"{model}:tokens"]
+
+        def peek(states):
+            now = time.time()
+            return {}, (self._refill(states[keys[0]], rpm, now), self._refill(states[keys[1]], tpm, now))
+
+        requests_left, tokens_left = self.store.update(keys, peek)
+        if requests_left < 1:
+            return {
+                "status": "cooldown",
+                "remaining_seconds": int((1 - requests_left) * 60.0 / rpm),
+                "requests_available": 0
+            }
+        requests_available = int(requests_left)
+        return {
+            "status": "ok",
+            "requests_available": requests_available,
+            "requests_made": rpm - requests_available,
+            "limit": rpm,
+            "tokens_available": int(tokens_left),
+            "token_limit": tpm
+        }
+
+
+def create_rate_limiter(limits, db_path=None):
+    """Create a RateLimiter, sharing state through SQLite when RATE_LIMIT_DB is set"""
+    db_path = db_path or os.environ.get('RATE_LIMIT_DB')
+    store = SQLiteBucketStore(db_path) if db_path else MemoryBucketStore()
+    return RateLimiter(limits, store=store)
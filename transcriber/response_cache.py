@@ -0,0 +1,75 @@
+"""
+Cache of Gemini text responses for summaries and questions.
+
+Responses are keyed on a hash of the model, prompt version and inputs, so the same
+request is answered from the cache instead of calling the API again. Recent entries
+are kept in an in-process LRU in front of a MongoDB collection that every worker
+shares; MongoDB expires entries through a TTL index (see db_indexes.py).
+"""
+
+import hashlib
+import datetime
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger('transcriber')
+
+
+def make_key(model, prompt_version, *inputs):
+    """Return a deterministic cache key for a request"""
+    digest = hashlib.sha256()
+    for part in (model, prompt_version) + inputs:
+        digest.update(str(part).encode('utf-8'))
+        # Separator so ('ab', 'c') and ('a', 'bc') hash differently
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """Two-tier (memory LRU, then MongoDB) cache of response text and its token usage."""
+
+    def __init__(self, collection, max_entries=256):
+        self.collection = collection
+        self.max_entries = max_entries
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _remember(self, key, entry):
+        with self.lock:
+            self.cache[key] = entry
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+
+    def get(self, key):
+        """Return {'text', 'token_usage'} for a cached response, or None"""
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+
+        try:
+            doc = self.collection.find_one({'_id': key}, {'text': 1, 'token_usage': 1, '_id': 0})
+        except Exception as e:
+            logger.error(f"Response cache lookup failed: {str(e)}")
+            return None
+        if doc is None or not doc.get('text'):
+            return None
+        self._remember(key, doc)
+        return doc
+
+    def put(self, key, text, token_usage):
+        """Cache a response in both tiers; empty responses (e.g. a failed stream) are not cached"""
+        if not text or not text.strip():
+            return
+        entry = {'text': text, 'token_usage': token_usage}
+        self._remember(key, entry)
+        try:
+            self.collection.update_one(
+                {'_id': key},
+                {'$set': dict(entry, created_at=datetime.datetime.utcnow())},
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"Failed to store cached response: {str(e)}")
@@ -0,0 +1,66 @@
+"""
+Retrieval over transcripts for question answering.
+
+A transcript is split into chunks of whole speaker turns and embedded once when it
+is saved. At question time only the question is embedded, and the chunks most
+similar to it are sent to the model instead of the whole transcript.
+"""
+
+import textwrap
+
+import numpy as np
+
+# Characters per chunk; speaker turns are kept whole unless a single turn is longer
+CHUNK_CHARS = 2000
+
+
+def chunk_transcript(transcript, max_chars=CHUNK_CHARS):
+    """Split a transcript into chunks of consecutive lines, each up to max_chars long"""
+    chunks, current, size = [], [], 0
+    for line in transcript.splitlines():
+        if not line.strip():
+            continue
+        pieces = textwrap.wrap(line, max_chars, break_long_words=False) if len(line) > max_chars else [line]
+        for piece in pieces:
+            if current and size + len(piece) > max_chars:
+                chunks.append('\n'.join(current))
+                current, size = [], 0
+            current.append(piece)
+            size += len(piece) + 1
+    if current:
+        chunks.append('\n'.join(current))
+    return chunks
+
+
+def normalize(vectors):
+    """Return float32 row vectors scaled to unit length"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def build_index(chunks, vectors, model):
+    """Pack chunks and their embeddings into a document for the transcript"""
+    vectors = normalize(vectors)
+    return {
+        'model': model,
+        'chunks': chunks,
+        'dim': int(vectors.shape[1]),
+        # Raw float32 bytes are a quarter the size of a BSON array of doubles
+        'embeddings': vectors.tobytes()
+    }
+
+
+def load_embeddings(index):
+    """Return the (chunks, dim) embedding matrix of an index document"""
+    return np.frombuffer(index['embeddings'], dtype=np.float32).reshape(len(index['chunks']), index['dim'])
+
+
+def top_chunks(index, question_vector, k):
+    """Return the k chunks most similar to the question, in transcript order"""
+    scores = load_embeddings(index) @ normalize(question_vector)
+    if k < len(scores):
+        best = np.argpartition(scores, -k)[-k:]
+    else:
+        best = np.arange(len(scores))
+    return [index['chunks'][i] for i in sorted(best)]
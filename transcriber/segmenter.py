@@ -0,0 +1,254 @@
+"""
+Streaming silence-based audio segmentation.
+
+Audio is decoded by ffmpeg straight to mono 16-bit PCM on a pipe and read in
+fixed windows, so memory use stays flat regardless of the recording length.
+"""
+
+import os
+import math
+import subprocess
+import uuid
+import logging
+import functools
+
+import numpy as np
+
+logger = logging.getLogger('transcriber')
+
+FFMPEG_BINARY = os.environ.get('FFMPEG_BINARY', 'ffmpeg')
+SAMPLE_RATE = 16000     # Speech models work at 16 kHz, no need to decode more
+WINDOW_MS = 100         # Size of each RMS analysis window
+BYTES_PER_SAMPLE = 2    # s16le
+# Segments are uploaded as 32 kbps mono Opus, roughly 8x smaller than 16 kHz WAV, when
+# ffmpeg was built with libopus; otherwise they are exported as WAV (see segment_format)
+OPUS_ENCODER = 'libopus'
+OPUS_EXTENSION = 'ogg'
+OPUS_CODEC_ARGS = ['-c:a', OPUS_ENCODER, '-b:a', '32k', '-application', 'voip']
+WAV_EXTENSION = 'wav'
+WAV_CODEC_ARGS = ['-c:a', 'pcm_s16le']
+# Playback copies are 64 kbps mono AAC, which every browser plays; faststart puts the
+# index at the front so players can seek with Range requests before the file is loaded
+PLAYBACK_EXTENSION = 'm4a'
+PLAYBACK_CODEC_ARGS = ['-c:a', 'aac', '-b:a', '64k', '-movflags', '+faststart']
+
+
+def iter_pcm_windows(audio_path, window_ms=WINDOW_MS, sample_rate=SAMPLE_RATE):
+    """Yield successive mono int16 PCM windows of the audio file."""
+    samples_per_window = sample_rate * window_ms // 1000
+    window_bytes = samples_per_window * BYTES_PER_SAMPLE
+    cmd = [
+        FFMPEG_BINARY, '-v', 'error', '-nostdin',
+        '-i', audio_path,
+        '-f', 's16le', '-acodec', 'pcm_s16le',
+        '-ac', '1', '-ar', str(sample_rate),
+        '-'
+    ]
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        while True:
+            data = process.stdout.read(window_bytes)
+            if not data:
+                break
+            # Drop a dangling odd byte rather than fail on the final window
+            usable = len(data) - (len(data) % BYTES_PER_SAMPLE)
+            if usable:
+                yield np.frombuffer(data[:usable], dtype=np.int16)
+    finally:
+        process.stdout.close()
+        stderr = process.stderr.read()
+        process.stderr.close()
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed to decode {audio_path}: {stderr.decode(errors='ignore').strip()}")
+
+
+def window_dbfs(window):
+    """Return the RMS level of a PCM window in dBFS."""
+    if window.size == 0:
+        return -float('inf')
+    rms = np.sqrt(np.mean(np.square(window, dtype=np.float64)))
+    if rms == 0:
+        return -float('inf')
+    return 20 * np.log10(rms / 32768.0)
+
+
+def find_silences(audio_path, min_silence_len=3000, silence_thresh=-45, window_ms=WINDOW_MS):
+    """
+    Scan the audio once and return (duration_seconds, silences) where each silence is a
+    (start_seconds, end_seconds) tuple lasting at least min_silence_len milliseconds.
+    """
+    silences = []
+    silence_start = None
+    position_ms = 0
+
+    for window in iter_pcm_windows(audio_path, window_ms=window_ms):
+        if window_dbfs(window) < silence_thresh:
+            if silence_start is None:
+                silence_start = position_ms
+        elif silence_start is not None:
+            if position_ms - silence_start >= min_silence_len:
+                silences.append((silence_start / 1000, position_ms / 1000))
+            silence_start = None
+        position_ms += window.size * 1000 // SAMPLE_RATE
+
+    if silence_start is not None and position_ms - silence_start >= min_silence_len:
+        silences.append((silence_start / 1000, position_ms / 1000))
+
+    return position_ms / 1000, silences
+
+
+def choose_cut_points(duration_seconds, silences, max_segments=10, allow_hard_cuts=False):
+    """
+    Pick at most max_segments - 1 cut points from the middle of the detected silences,
+    preferring the ones closest to evenly spaced boundaries so segments stay balanced.
+
+    With allow_hard_cuts, a boundary with no silence nearby is cut at its target position
+    anyway (the caller is expected to overlap segments and stitch the text).
+    """
+    candidates = [(start + end) / 2 for start, end in silences]
+    if max_segments < 2 or (not candidates and not allow_hard_cuts):
+        return []
+    if len(candidates) < max_segments and not allow_hard_cuts:
+        return candidates
+
+    cut_points = []
+    target_length = duration_seconds / max_segments
+    for i in range(1, max_segments):
+        target = i * target_length
+        best = min(candidates, key=lambda c: abs(c - target)) if candidates else None
+        if allow_hard_cuts and (best is None or abs(best - target) > target_length / 4):
+            best = target
+        if best not in cut_points:
+            cut_points.append(best)
+    return sorted(cut_points)
+
+
+@functools.lru_cache(maxsize=None)
+def has_encoder(name):
+    """Return whether the ffmpeg binary lists the named audio encoder."""
+    try:
+        result = subprocess.run([FFMPEG_BINARY, '-hide_banner', '-encoders'], capture_output=True, text=True)
+    except OSError:
+        return False
+    # Lines look like " A....D libopus              libopus Opus"
+    return result.returncode == 0 and any(line.split()[1:2] == [name] for line in result.stdout.splitlines())
+
+
+@functools.lru_cache(maxsize=None)
+def segment_format():
+    """Return (extension, codec args) for exported segments, probing ffmpeg once per process."""
+    if has_encoder(OPUS_ENCODER):
+        return OPUS_EXTENSION, OPUS_CODEC_ARGS
+    logger.warning(f"{FFMPEG_BINARY} has no {OPUS_ENCODER} encoder, exporting segments as WAV")
+    return WAV_EXTENSION, WAV_CODEC_ARGS
+
+
+def export_segment(audio_path, start, end, output_path, sample_rate=SAMPLE_RATE):
+    """Cut [start, end) seconds out of audio_path into a compressed mono file using ffmpeg."""
+    cmd = [
+        FFMPEG_BINARY, '-v', 'error', '-nostdin', '-y',
+        '-ss', f"{start:.3f}",
+        '-i', audio_path,
+    ]
+    if end is not None:
+        cmd += ['-t', f"{end - start:.3f}"]
+    cmd += ['-ac', '1', '-ar', str(sample_rate), *segment_format()[1], output_path]
+    subprocess.run(cmd, check=True, capture_output=True)
+    return output_path
+
+
+def compress_audio(audio_path, output_dir):
+    """
+    Re-encode a whole audio file to the compact segment format and return the new path,
+    or None when segments fall back to WAV and there is nothing to gain.
+    """
+    extension = segment_format()[0]
+    if extension == WAV_EXTENSION:
+        return None
+    output_path = os.path.join(output_dir, f"compressed_{uuid.uuid4().hex[:6]}.{extension}")
+    return export_segment(audio_path, 0.0, None, output_path)
+
+
+def encode_playback(audio_path, output_path):
+    """Encode an audio file into the compact playback format at output_path."""
+    # Encode next to the target and rename, so a concurrent reader never sees a partial file
+    temp_path = f"{output_path}.{uuid.uuid4().hex[:6]}.tmp.{PLAYBACK_EXTENSION}"
+    cmd = [
+        FFMPEG_BINARY, '-v', 'error', '-nostdin', '-y',
+        '-i', audio_path,
+        '-map', '0:a:0', '-vn', '-ac', '1', *PLAYBACK_CODEC_ARGS,
+        temp_path
+    ]
+    try:
+        subprocess.run(cmd, check=True, capture_output=True)
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return output_path
+
+
+def extract_audio(video_path, output_dir, basename):
+    """
+    Pull the first audio track out of a video without touching the video stream.
+
+    The track is stream-copied into an .m4a container when possible (no re-encode);
+    if the codec cannot be copied it is encoded once into the playback format instead.
+    Returns the path of the extracted audio file.
+    """
+    output_path = os.path.join(output_dir, f"{basename}.{PLAYBACK_EXTENSION}")
+    cmd = [
+        FFMPEG_BINARY, '-v', 'error', '-nostdin', '-y',
+        '-i', video_path,
+        '-map', '0:a:0', '-vn', '-c:a', 'copy', '-movflags', '+faststart',
+        output_path
+    ]
+    result = subprocess.run(cmd, capture_output=True)
+    if result.returncode == 0:
+        return output_path
+
+    logger.info(f"Audio stream copy failed, encoding audio track instead: {result.stderr.decode(errors='ignore').strip()}")
+    if os.path.exists(output_path):
+        os.remove(output_path)
+    return encode_playback(video_path, output_path)
+
+
+def split_audio_file(audio_path, output_dir, min_segment_seconds=300, max_segments=10,
+                     min_silence_len=3000, silence_thresh=-45,
+                     target_segment_seconds=None, overlap_seconds=0):
+    """
+    Split an audio file on silence without loading it into memory.
+
+    When target_segment_seconds is given the number of segments follows the duration
+    (still capped at max_segments). With overlap_seconds > 0 every segment after the
+    first starts that much before its cut point, so the transcripts can be stitched.
+
+    Returns a list of segment file paths, or [audio_path] when the file is short or no
+    usable silence was found.
+    """
+    duration_seconds, silences = find_silences(
+        audio_path, min_silence_len=min_silence_len, silence_thresh=silence_thresh)
+
+    # For shorter audio files, don't segment
+    if duration_seconds < min_segment_seconds:
+        logger.info(f"Audio file is short ({duration_seconds:.1f}s), processing as a single segment")
+        return [audio_path]
+
+    if target_segment_seconds:
+        max_segments = min(max_segments, max(2, math.ceil(duration_seconds / target_segment_seconds)))
+    cut_points = choose_cut_points(duration_seconds, silences, max_segments=max_segments,
+                                   allow_hard_cuts=overlap_seconds > 0)
+    logger.info(f"Found {len(silences)} silences, cutting audio into {len(cut_points) + 1} segments")
+    if not cut_points:
+        return [audio_path]
+
+    boundaries = [0.0] + cut_points + [None]
+    segment_files = []
+    for i in range(len(boundaries) - 1):
+        segment_filename = f"segment_{i}_{uuid.uuid4().hex[:6]}.{segment_format()[0]}"
+        segment_path = os.path.join(output_dir, segment_filename)
+        start = max(0.0, boundaries[i] - overlap_seconds) if i else 0.0
+        export_segment(audio_path, start, boundaries[i + 1], segment_path)
+        segment_files.append(segment_path)
+
+    return segment_files
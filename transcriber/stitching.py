@@ -0,0 +1,162 @@
+"""
+Stitch transcripts of overlapping audio segments back into one transcript.
+
+Consecutive segments share a few seconds of audio. The words transcribed twice are
+found with a sequence alignment over the tail of one segment and the head of the
+next (a window sized from the shared seconds), the duplicate copy is dropped, and the
+aligned words are used to map each segment's "Speaker N" labels onto the labels
+already used earlier in the transcript. Segments whose edges don't line up are
+concatenated as they are.
+"""
+
+import re
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+
+# Matches "Speaker 2: text" or "Jane Smith: text" (same shapes the UI highlights)
+SPEAKER_LINE_RE = re.compile(r"^\**(Speaker \d+|[A-Z][\w.'-]*(?: [A-Z][\w.'-]*){0,3})\**\s*:\s*(.*)$")
+GENERIC_SPEAKER_RE = re.compile(r"^Speaker (\d+)$")
+
+# Upper bound on speech rate, used to size the overlap window from the shared seconds
+MAX_WORDS_PER_SECOND = 4
+# Shortest run of identical words accepted as the overlap
+MIN_MATCH_WORDS = 3
+# Words at the very edge of a segment that may be cut off or garbled and still be
+# outside the alignment
+EDGE_SLACK_WORDS = 1
+
+
+def normalize_word(word):
+    return re.sub(r"[^\w']", "", word.lower())
+
+
+def tokenize(text):
+    """Split a transcript into (speaker, word) tokens; unlabelled lines continue the last speaker."""
+    tokens = []
+    speaker = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        match = SPEAKER_LINE_RE.match(line)
+        if match:
+            speaker, line = match.group(1), match.group(2)
+        for word in line.split():
+            tokens.append((speaker, word))
+    return tokens
+
+
+def overlap_window(overlap_seconds):
+    """Number of words at each side of a boundary searched for the overlap"""
+    return max(MIN_MATCH_WORDS, round(overlap_seconds * MAX_WORDS_PER_SECOND))
+
+
+def find_overlap(prev_tokens, next_tokens, window, min_match=MIN_MATCH_WORDS):
+    """
+    Align the tail of prev_tokens with the head of next_tokens.
+
+    Returns (prev_end, next_start, pairs) where prev_tokens[:prev_end] and
+    next_tokens[next_start:] can be concatenated without duplicating the overlap,
+    and pairs are the aligned (prev_index, next_index) positions. Returns None unless
+    runs of at least min_match words align that reach the end of prev_tokens and the
+    start of next_tokens (a phrase repeated elsewhere in the window is not an overlap).
+    """
+    offset = max(0, len(prev_tokens) - window)
+    tail = [normalize_word(word) for _, word in prev_tokens[offset:]]
+    head = [normalize_word(word) for _, word in next_tokens[:window]]
+    matcher = SequenceMatcher(None, tail, head, autojunk=False)
+    blocks = [block for block in matcher.get_matching_blocks() if block.size >= min_match]
+    if not blocks:
+        return None
+    first, last = blocks[0], blocks[-1]
+    if first.b > EDGE_SLACK_WORDS or len(tail) - (last.a + last.size) > EDGE_SLACK_WORDS:
+        return None
+
+    # Switch to the next segment at the first aligned word: from there on it holds
+    # the same speech, and unlike the previous segment it is not cut off at the end
+    pairs = [
+        (offset + block.a + i, block.b + i)
+        for block in blocks
+        for i in range(block.size)
+    ]
+    return offset + first.a, first.b, pairs
+
+
+def map_speakers(prev_tokens, next_tokens, pairs, used_labels):
+    """
+    Map the speaker labels of next_tokens onto labels already used in prev_tokens.
+
+    Aligned words vote for a mapping; generic labels with no votes keep their name unless
+    it was claimed by another label, in which case the next free "Speaker N" is used.
+    """
+    votes = defaultdict(Counter)
+    for prev_index, next_index in pairs:
+        prev_speaker = prev_tokens[prev_index][0]
+        next_speaker = next_tokens[next_index][0]
+        if prev_speaker and next_speaker:
+            votes[next_speaker][prev_speaker] += 1
+
+    mapping = {}
+    claimed = set()
+    for label, counter in votes.items():
+        target = counter.most_common(1)[0][0]
+        if target not in claimed:
+            mapping[label] = target
+            claimed.add(target)
+
+    next_number = max(
+        [int(m.group(1)) for m in map(GENERIC_SPEAKER_RE.match, used_labels) if m] or [0]
+    ) + 1
+    for label in dict.fromkeys(speaker for speaker, _ in next_tokens if speaker):
+        if label in mapping:
+            continue
+        if label in claimed and GENERIC_SPEAKER_RE.match(label):
+            while f"Speaker {next_number}" in used_labels or f"Speaker {next_number}" in claimed:
+                next_number += 1
+            mapping[label] = f"Speaker {next_number}"
+        else:
+            mapping[label] = label
+        claimed.add(mapping[label])
+    return mapping
+
+
+def format_tokens(tokens):
+    """Rebuild "Speaker: text" lines, starting a new line whenever the speaker changes."""
+    lines = []
+    current_speaker = object()
+    words = []
+    for speaker, word in tokens:
+        if speaker != current_speaker and words:
+            lines.append(f"{current_speaker}: {' '.join(words)}" if current_speaker else ' '.join(words))
+            words = []
+        current_speaker = speaker
+        words.append(word)
+    if words:
+        lines.append(f"{current_speaker}: {' '.join(words)}" if current_speaker else ' '.join(words))
+    return "\n".join(lines)
+
+
+def stitch_transcripts(texts, overlap_seconds):
+    """Join the transcripts of consecutive segments sharing overlap_seconds of audio into one transcript."""
+    window = overlap_window(overlap_seconds)
+    merged = []
+    for text in texts:
+        tokens = tokenize(text)
+        if not tokens:
+            continue
+        if not merged:
+            merged = tokens
+            continue
+
+        overlap = find_overlap(merged, tokens, window) if overlap_seconds > 0 else None
+        pairs = overlap[2] if overlap else []
+        used_labels = {speaker for speaker, _ in merged if speaker}
+        mapping = map_speakers(merged, tokens, pairs, used_labels)
+        tokens = [(mapping.get(speaker, speaker), word) for speaker, word in tokens]
+
+        if overlap:
+            prev_end, next_start, _ = overlap
+            merged = merged[:prev_end] + tokens[next_start:]
+        else:
+            merged = merged + tokens
+    return format_tokens(merged)
@@ -0,0 +1,61 @@
+"""
+Helpers for map-reduce summarization of long transcripts.
+
+A long transcript is cut into chunks of whole speaker turns, each chunk is summarized
+on its own, and the partial summaries are reduced into the final summary. Chunk
+boundaries depend only on nearby lines, so an edit only changes the chunks around
+it. Partial summaries are cached by content hash, so unchanged chunks are not sent
+again.
+"""
+
+import zlib
+import textwrap
+import hashlib
+import datetime
+
+# Average number of lines between content-defined cut points once a chunk is half full
+CUT_EVERY_LINES = 8
+
+
+def chunk_turns(transcript, max_chars):
+    """
+    Split a transcript into chunks of whole lines (speaker turns) of at most max_chars.
+
+    A chunk is cut after a line whose checksum hits the cut condition once the chunk is
+    at least half full, and always before it would overflow.
+    """
+    chunks, current, size = [], [], 0
+    for raw_line in transcript.splitlines():
+        if not raw_line.strip():
+            continue
+        for line in textwrap.wrap(raw_line, max_chars, break_long_words=False) if len(raw_line) > max_chars else [raw_line]:
+            if current and size + len(line) > max_chars:
+                chunks.append('\n'.join(current))
+                current, size = [], 0
+            current.append(line)
+            size += len(line) + 1
+            if size >= max_chars // 2 and zlib.crc32(line.encode('utf-8')) % CUT_EVERY_LINES == 0:
+                chunks.append('\n'.join(current))
+                current, size = [], 0
+    if current:
+        chunks.append('\n'.join(current))
+    return chunks
+
+
+def partial_key(model, prompt_version, chunk):
+    """Cache key of a chunk summary"""
+    return hashlib.sha256(f"{model}\0{prompt_version}\0{chunk}".encode('utf-8')).hexdigest()
+
+
+def get_partials(collection, keys):
+    """Return {key: summary} for the cached partial summaries among keys"""
+    return {doc['_id']: doc['summary'] for doc in collection.find({'_id': {'$in': list(keys)}}, {'summary': 1})}
+
+
+def store_partial(collection, key, summary):
+    """Cache a partial summary"""
+    collection.update_one(
+        {'_id': key},
+        {'$set': {'summary': summary, 'created_at': datetime.datetime.utcnow()}},
+        upsert=True
+    )
@@ -0,0 +1,89 @@
+"""
+Buffered writer for API call accounting documents.
+
+Documents are queued in memory and written with insert_many from a background
+thread once a batch fills up or the flush interval passes, so request threads
+never wait on a MongoDB round-trip for accounting.
+"""
+
+import time
+import queue
+import atexit
+import threading
+import logging
+
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger('transcriber')
+
+
+class BufferedWriter:
+    """Queue documents and flush them to a collection in batches."""
+
+    def __init__(self, collection, max_batch=100, flush_interval=2.0, max_queue=10000, on_flush=None):
+        self.collection = collection
+        # Called with each batch after it is inserted (e.g. to update rollups)
+        self.on_flush = on_flush
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='telemetry-writer', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def write(self, doc):
+        """Queue a document; never blocks the caller"""
+        try:
+            self.queue.put_nowait(doc)
+        except queue.Full:
+            logger.error(f"Telemetry queue full, dropping document: {doc}")
+
+    def _take_batch(self, timeout):
+        """Collect up to max_batch documents, waiting at most timeout seconds in total"""
+        batch = []
+        deadline = time.monotonic() + timeout
+        try:
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    batch.append(self.queue.get_nowait())
+                else:
+                    batch.append(self.queue.get(timeout=remaining))
+        except queue.Empty:
+            pass
+        return batch
+
+    def _flush(self, batch):
+        if not batch:
+            return
+        try:
+            self.collection.insert_many(batch, ordered=False)
+            logger.debug(f"Flushed {len(batch)} telemetry documents")
+        except BulkWriteError as e:
+            # Unordered: every document without a write error was inserted
+            failed = {error['index'] for error in e.details['writeErrors']}
+            logger.error(f"Failed to flush {len(failed)} of {len(batch)} telemetry documents: "
+                         f"{e.details['writeErrors'][0]['errmsg']}")
+            batch = [doc for i, doc in enumerate(batch) if i not in failed]
+        except Exception as e:
+            logger.error(f"Failed to flush {len(batch)} telemetry documents: {str(e)}")
+            return
+        if self.on_flush and batch:
+            try:
+                self.on_flush(batch)
+            except Exception as e:
+                logger.error(f"Telemetry flush hook failed for {len(batch)} documents: {str(e)}")
+
+    def _run(self):
+        while not self.stopped.is_set():
+            self._flush(self._take_batch(self.flush_interval))
+
+    def close(self):
+        """Stop the background thread and write out everything still queued"""
+        if self.stopped.is_set():
+            return
+        self.stopped.set()
+        self.thread.join(timeout=self.flush_interval + 5)
+        while batch := self._take_batch(timeout=0):
+            self._flush(batch)
@@ -0,0 +1,104 @@
+import sys
+import importlib
+from types import SimpleNamespace
+
+import pytest
+from pymongo import DeleteOne, InsertOne, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+
+class StubModels:
+    """Stands in for genai.Client().models, answering every request with a fixed transcript"""
+
+    transcript = "Speaker 1: Thanks everyone for joining.\nSpeaker 2: Happy to be here."
+
+    def __init__(self):
+        self.requests = []
+
+    def generate_content(self, model, contents, **kwargs):
+        self.requests.append((model, contents))
+        return SimpleNamespace(
+            text=self.transcript,
+            usage_metadata=SimpleNamespace(total_token_count=150, prompt_token_count=120, candidates_token_count=30)
+        )
+
+    def embed_content(self, model, contents, **kwargs):
+        self.requests.append((model, contents))
+        return SimpleNamespace(embeddings=[SimpleNamespace(values=[1.0, float(len(text))]) for text in contents])
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """Import app against an in-memory MongoDB, with its files under a temp directory"""
+    mongomock = pytest.importorskip("mongomock")
+    pytest.importorskip("google.genai")
+    pytest.importorskip("dotenv")
+    workdir = tmp_path_factory.mktemp("app")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr("pymongo.MongoClient", mongomock.MongoClient)
+        mp.chdir(workdir)
+        mp.setenv("JOBS_DB", str(workdir / "jobs.db"))
+        mp.setenv("AUDIO_CACHE_INDEX", str(workdir / "audio_cache.db"))
+        for name in ("app", "user_auth"):
+            sys.modules.pop(name, None)
+        app = importlib.import_module("app")
+        yield app
+        app.audio_cache_manager.stop()
+
+
+@pytest.fixture
+def gemini(app_module, monkeypatch):
+    """Replace the app's Gemini client with a StubModels that records each request"""
+    models = StubModels()
+    # app only defines client when GOOGLE_API_KEY is set
+    monkeypatch.setattr(app_module, 'client', SimpleNamespace(models=models), raising=False)
+    return models
+
+
+def bulk_write(collection, requests, ordered=True, **kwargs):
+    """Apply pymongo bulk requests one at a time, reporting duplicate keys like the server does"""
+    errors = []
+    for index, request in enumerate(requests):
+        try:
+            if isinstance(request, UpdateOne):
+                collection.update_one(request._filter, request._doc, upsert=request._upsert)
+            elif isinstance(request, ReplaceOne):
+                collection.replace_one(request._filter, request._doc, upsert=request._upsert)
+            elif isinstance(request, InsertOne):
+                collection.insert_one(request._doc)
+            elif isinstance(request, DeleteOne):
+                collection.delete_one(request._filter)
+            else:
+                raise NotImplementedError(type(request).__name__)
+        except DuplicateKeyError as e:
+            errors.append({'index': index, 'code': 11000, 'errmsg': str(e)})
+            if ordered:
+                break
+    if errors:
+        raise BulkWriteError({'writeErrors': errors, 'writeConcernErrors': [], 'nInserted': 0,
+                              'nUpserted': 0, 'nMatched': 0, 'nModified': 0, 'nRemoved': 0, 'upserted': []})
+
+
+@pytest.fixture
+def mongo_db(monkeypatch):
+    """
+    An empty mongomock database.
+
+    mongomock's bulk_write rejects the arguments current pymongo passes and it has no
+    $merge stage, so both are filled in with the equivalent single-document operations.
+    """
+    mongomock = pytest.importorskip("mongomock")
+    aggregate = mongomock.Collection.aggregate
+
+    def aggregate_with_merge(collection, pipeline, *args, **kwargs):
+        if not pipeline or '$merge' not in pipeline[-1]:
+            return aggregate(collection, pipeline, *args, **kwargs)
+        # Only the whenMatched: replace / whenNotMatched: insert form on _id is used
+        target = collection.database[pipeline[-1]['$merge']['into']]
+        for doc in aggregate(collection, pipeline[:-1], *args, **kwargs):
+            target.replace_one({'_id': doc['_id']}, doc, upsert=True)
+        return iter([])
+
+    monkeypatch.setattr(mongomock.Collection, 'bulk_write', bulk_write)
+    monkeypatch.setattr(mongomock.Collection, 'aggregate', aggregate_with_merge)
+    return mongomock.MongoClient().db
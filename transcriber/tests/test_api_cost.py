@@ -0,0 +1,36 @@
+import pytest
+
+import api_cost
+
+
+def test_calculate_costs_matches_calculate_cost_per_row():
+    models = ["gemini-2.0-flash", "gemini-2.0-pro", "gemini-2.0-flash", "unknown-model"]
+    input_tokens = [1000, 2500, 0, 4000]
+    output_tokens = [200, 0, 700, 100]
+
+    costs = api_cost.calculate_costs(models, input_tokens, output_tokens)
+
+    assert costs.tolist() == pytest.approx([
+        api_cost.calculate_cost(model, prompt, response)
+        for model, prompt, response in zip(models, input_tokens, output_tokens)
+    ])
+
+
+def test_unknown_models_are_priced_as_the_default_model():
+    costs = api_cost.calculate_costs(["unknown-model"], [1000], [1000])
+    assert costs[0] == pytest.approx(api_cost.calculate_cost(api_cost.DEFAULT_MODEL, 1000, 1000))
+
+
+def test_calculate_costs_uses_the_given_price_version(monkeypatch):
+    current = api_cost.PRICE_TABLES[api_cost.CURRENT_PRICE_VERSION]
+    doubled = {model: {side: price * 2 for side, price in prices.items()} for model, prices in current.items()}
+    monkeypatch.setitem(api_cost.PRICE_TABLES, "2099-01", doubled)
+
+    current_costs = api_cost.calculate_costs(["gemini-2.0-pro"], [1000], [500])
+    doubled_costs = api_cost.calculate_costs(["gemini-2.0-pro"], [1000], [500], "2099-01")
+
+    assert doubled_costs[0] == pytest.approx(current_costs[0] * 2)
+
+
+def test_no_rows_cost_nothing():
+    assert api_cost.calculate_costs([], [], []).shape == (0,)
@@ -0,0 +1,27 @@
+import audio_cache
+
+
+def make_manager(tmp_path, max_bytes=1024):
+    directory = tmp_path / "cache"
+    directory.mkdir()
+    return audio_cache.CacheManager(str(directory), str(tmp_path / "index.db"), max_bytes), directory
+
+
+def test_add_records_size(tmp_path):
+    manager, directory = make_manager(tmp_path)
+    (directory / "a_audio.m4a").write_bytes(bytes(100))
+
+    assert manager.add("a_audio.m4a")
+    assert manager.total_bytes() == 100
+
+
+def test_add_of_an_evicted_file_is_a_miss(tmp_path):
+    manager, directory = make_manager(tmp_path)
+    (directory / "a_audio.m4a").write_bytes(bytes(100))
+    manager.add("a_audio.m4a")
+
+    # Evicted after the caller saw it on disk, before add() ran
+    (directory / "a_audio.m4a").unlink()
+
+    assert not manager.add("a_audio.m4a")
+    assert manager.total_bytes() == 0
@@ -0,0 +1,28 @@
+import logging
+
+import pytest
+from pymongo.errors import OperationFailure
+
+import db_indexes
+
+mongomock = pytest.importorskip("mongomock")
+
+
+def test_duplicate_users_fail_startup():
+    db = mongomock.MongoClient().db
+    db.users.insert_many([{'email': 'a@example.com', 'username': 'a', 'user_id': '1'},
+                          {'email': 'a@example.com', 'username': 'b', 'user_id': '2'}])
+
+    with pytest.raises(OperationFailure):
+        db_indexes.ensure_indexes(db)
+
+
+def test_other_index_failures_are_logged(caplog):
+    db = mongomock.MongoClient().db
+    db.transcripts.insert_many([{'user_id': 'u', 'transcript_id': 't'}, {'user_id': 'u', 'transcript_id': 't'}])
+
+    with caplog.at_level(logging.ERROR, logger='transcriber'):
+        db_indexes.ensure_indexes(db)
+
+    assert "on transcripts" in caplog.text
+    assert 'email_1' in db.users.index_information()
@@ -0,0 +1,84 @@
+import datetime
+
+import click
+import pytest
+from bson import ObjectId
+
+import dump_db
+
+NOW = datetime.datetime.utcnow().replace(microsecond=0)
+
+
+def sample_documents():
+    return {
+        'users': [
+            {'_id': ObjectId(), 'user_id': 'user-1', 'username': 'alice', 'email': 'alice@example.com',
+             'password_hash': 'hash', 'salt': 'salt', 'created_at': NOW},
+        ],
+        'transcripts': [
+            {'_id': ObjectId(), 'user_id': 'user-1', 'transcript_id': f't-{i}', 'transcript': 'Hello ' * i,
+             'digest': f'd-{i}', 'speakers': {'A': 'Alice'}, 'created_at': NOW - datetime.timedelta(hours=i)}
+            for i in range(5)
+        ],
+        'api_calls': [
+            {'_id': ObjectId(), 'user_id': 'user-1', 'request_type': 'qa', 'prompt_tokens': 100 + i,
+             'response_tokens': 20, 'datetime': NOW - datetime.timedelta(minutes=i)}
+            for i in range(3)
+        ],
+    }
+
+
+def contents(db):
+    return {name: sorted(db[name].find(), key=lambda doc: doc['_id']) for name in dump_db.EXPORT_COLLECTIONS}
+
+
+@pytest.fixture
+def source(mongo_db):
+    for name, docs in sample_documents().items():
+        mongo_db[name].insert_many(docs)
+    return mongo_db
+
+
+@pytest.fixture
+def target(mongo_db):
+    return mongo_db.client['restored']
+
+
+def test_dump_and_restore_round_trip(source, target, tmp_path):
+    assert dump_db.dump_db_to_json(str(tmp_path), anonymize=False, workers=2, db=source)
+
+    counts = dump_db.restore_db(str(tmp_path), drop=True, workers=2, db=target)
+
+    assert counts == {'users': 1, 'transcripts': 5, 'api_calls': 3}
+    assert contents(target) == contents(source)
+
+
+def test_incremental_dumps_restore_everything(source, target, tmp_path):
+    assert dump_db.dump_db_to_json(str(tmp_path), anonymize=False, db=source)
+    source.transcripts.insert_one({'_id': ObjectId(), 'user_id': 'user-1', 'transcript_id': 't-new',
+                                   'transcript': 'Later', 'created_at': NOW})
+    assert dump_db.dump_db_to_json(str(tmp_path), anonymize=False, incremental=True, db=source)
+
+    counts = dump_db.restore_db(str(tmp_path), db=target)
+
+    assert counts['transcripts'] == 6
+    assert contents(target) == contents(source)
+
+
+def test_restoring_twice_skips_documents_already_present(source, target, tmp_path):
+    assert dump_db.dump_db_to_json(str(tmp_path), anonymize=False, db=source)
+    dump_db.restore_db(str(tmp_path), db=target)
+
+    assert dump_db.restore_db(str(tmp_path), db=target) == {'users': 0, 'transcripts': 0, 'api_calls': 0}
+    assert contents(target) == contents(source)
+
+
+def test_anonymized_dump_is_refused_without_force(source, target, tmp_path):
+    assert dump_db.dump_db_to_json(str(tmp_path), anonymize=True, db=source)
+
+    with pytest.raises(click.ClickException, match="anonymized"):
+        dump_db.restore_db(str(tmp_path), db=target)
+    assert target.users.count_documents({}) == 0
+
+    dump_db.restore_db(str(tmp_path), db=target, force=True)
+    assert target.users.find_one()['password_hash'] == '[REDACTED]'
@@ -0,0 +1,104 @@
+import subprocess
+import sys
+import wave
+
+import jobs
+
+
+class RecordingStore(jobs.JobStore):
+    """JobStore that remembers every stage a job went through"""
+
+    def __init__(self, db_path):
+        super().__init__(db_path)
+        self.stages = []
+
+    def update(self, job_id, **fields):
+        if 'stage' in fields:
+            self.stages.append(fields['stage'])
+        super().update(job_id, **fields)
+
+
+def test_transcription_job_runs_through_queue(app_module, gemini, tmp_path):
+    upload = tmp_path / "meeting.mp3"
+    upload.write_bytes(b"ID3" + bytes(4096))
+    queue = jobs.JobQueue(RecordingStore(str(tmp_path / "jobs.db")), max_workers=1)
+
+    job_id = queue.submit('user-1', app_module.run_transcription_job, str(upload), 'meeting.mp3', 'user-1')
+    queue.shutdown(wait=True)
+
+    job = queue.store.get(job_id)
+    assert job['status'] == jobs.JOB_DONE, job['error']
+    assert queue.store.stages == ['starting', 'segmenting', 'transcribing', 'saving', 'indexing', jobs.JOB_DONE]
+    assert job['progress'] == 1.0
+
+    result = job['result']
+    assert result['transcript'] == gemini.transcript
+    assert result['user_id'] == 'user-1'
+    assert result['audioUrl'].startswith('/audio/') and result['audioUrl'].endswith('_meeting.mp3')
+
+    (model, contents), = gemini.requests
+    assert model == app_module.TRANSCRIPTION_MODEL
+    assert contents[0]['parts'][0]['text'] == app_module.FILE_PROMPT
+    saved = app_module.user_auth.transcripts_collection.find_one({'transcript_id': result['sessionId']})
+    assert saved['transcript'] == gemini.transcript
+    assert not upload.exists()
+
+
+def test_failed_playback_encode_still_transcribes(app_module, gemini, tmp_path, monkeypatch):
+    upload = tmp_path / "call.wav"
+    with wave.open(str(upload), 'wb') as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(16000)
+        out.writeframes(bytes(32000))
+
+    def broken_encode(audio_path, output_path):
+        raise subprocess.CalledProcessError(1, ['ffmpeg'])
+
+    monkeypatch.setattr(app_module.segmenter, 'encode_playback', broken_encode)
+    queue = jobs.JobQueue(RecordingStore(str(tmp_path / "jobs.db")), max_workers=1)
+
+    job_id = queue.submit('user-1', app_module.run_transcription_job, str(upload), 'call.wav', 'user-1')
+    queue.shutdown(wait=True)
+
+    job = queue.store.get(job_id)
+    assert job['status'] == jobs.JOB_DONE, job['error']
+    assert job['result']['transcript'] == gemini.transcript
+    # Played back from the upload itself instead of the missing AAC copy
+    assert job['result']['audioUrl'].endswith('_call.wav')
+
+
+def test_failed_job_records_error(tmp_path):
+    queue = jobs.JobQueue(RecordingStore(str(tmp_path / "jobs.db")), max_workers=1)
+
+    def fail(progress):
+        progress('transcribing', 0.5)
+        raise RuntimeError("transcription failed")
+
+    job_id = queue.submit('user-1', fail)
+    queue.shutdown(wait=True)
+
+    job = queue.store.get(job_id)
+    assert job['status'] == jobs.JOB_FAILED
+    assert job['error'] == "transcription failed"
+
+
+def test_jobs_of_a_dead_process_are_failed_on_startup(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    store = jobs.JobStore(db_path)
+    orphaned = store.create('user-1')
+    store.update(orphaned, status=jobs.JOB_RUNNING, stage='transcribing')
+    live = store.create('user-1')
+
+    # A process that has exited stands in for a restarted worker
+    finished = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'],
+                              capture_output=True, text=True, check=True)
+    dead_owner = f"{jobs.socket.gethostname()}:{finished.stdout.strip()}"
+    with store._connect() as conn:
+        conn.execute("UPDATE jobs SET owner = ? WHERE job_id = ?", (dead_owner, orphaned))
+
+    jobs.JobQueue(jobs.JobStore(db_path), max_workers=1).shutdown()
+
+    assert store.get(orphaned)['status'] == jobs.JOB_FAILED
+    assert store.get(orphaned)['error'] == jobs.JOB_INTERRUPTED_ERROR
+    assert store.get(live)['status'] == jobs.JOB_QUEUED
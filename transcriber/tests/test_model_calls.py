@@ -0,0 +1,94 @@
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+import rate_limit
+
+RATE_LIMITED = Exception("429 RESOURCE_EXHAUSTED {'retryDelay': '1s'}")
+
+
+class FakeClock:
+    """time module stand-in whose sleep() advances the clock instead of blocking"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def tokens_left(limiter, model):
+    """Level of a model's token bucket as last written (the fake clock has not moved since)"""
+    return limiter.store.states[f"{model}:tokens"][0]
+
+
+@pytest.fixture
+def calls(app_module, monkeypatch):
+    """Capture record_api_call arguments instead of queueing them for MongoDB"""
+    recorded = []
+    monkeypatch.setattr(app_module, 'record_api_call', lambda *args, **kwargs: recorded.append(args))
+    return recorded
+
+
+@pytest.fixture
+def limiter(app_module, monkeypatch):
+    """A fresh in-memory limiter on a fake clock, with a small token budget for the QnA model"""
+    monkeypatch.setattr(rate_limit, 'time', FakeClock())
+    limiter = rate_limit.RateLimiter({app_module.QnA_MODEL: {"requests_per_minute": 60, "tokens_per_minute": 6000}})
+    monkeypatch.setattr(app_module, 'rate_limiter', limiter)
+    return limiter
+
+
+def test_embeddings_are_recorded_and_charged(app_module, gemini, calls, monkeypatch):
+    monkeypatch.setattr(app_module, 'EMBED_BATCH_SIZE', 2)
+    session_id = str(uuid.uuid4())
+    app_module.session_costs.start(session_id)
+    texts = ["a" * 40, "b" * 80, "c" * 120]
+
+    vectors = app_module.embed_texts(texts, "RETRIEVAL_DOCUMENT", 'user-1', session_id)
+
+    assert len(vectors) == 3
+    # One record per request: batches of two texts
+    assert calls == [('user-1', "embedding", 30, 30, 0, app_module.EMBEDDING_MODEL),
+                     ('user-1', "embedding", 30, 30, 0, app_module.EMBEDDING_MODEL)]
+    tracker = app_module.session_costs.get_tracker(session_id)
+    assert tracker.get_request_count_by_type() == {"embedding": 2}
+    assert tracker.total_tokens == 60
+
+
+def test_stream_retries_do_not_leak_reservations(app_module, gemini, limiter):
+    attempts = []
+
+    def generate_content_stream(model, contents, **kwargs):
+        attempts.append(model)
+        if len(attempts) == 1:
+            # The API reports the 429 only once the stream is read
+            raise RATE_LIMITED
+        yield SimpleNamespace(text="The launch moved to March.", usage_metadata=None)
+        yield SimpleNamespace(text="", usage_metadata=SimpleNamespace(
+            total_token_count=50, prompt_token_count=40, candidates_token_count=10))
+
+    gemini.generate_content_stream = generate_content_stream
+    context = "Speaker 1: " + "we talked about the launch " * 150
+
+    items = list(app_module.stream_answer(context, "When is the launch?"))
+
+    assert len(attempts) == 2
+    assert items[0] == "The launch moved to March."
+    assert items[-1]["total_token_count"] == 50
+    # Only the tokens actually used are gone from the bucket, despite the retried reservation
+    assert tokens_left(limiter, app_module.QnA_MODEL) == 6000 - 50
+
+
+def test_failed_call_gives_back_its_reservation(app_module, limiter):
+    def fail(**kwargs):
+        raise RuntimeError("backend unavailable")
+
+    with pytest.raises(RuntimeError):
+        app_module.api_call_with_rate_limiting(app_module.QnA_MODEL, fail, estimated_tokens=1000)
+
+    assert tokens_left(limiter, app_module.QnA_MODEL) == 6000
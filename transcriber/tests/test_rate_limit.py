@@ -0,0 +1,104 @@
+import pytest
+
+import rate_limit
+
+MODEL = "gemini-2.0-flash"
+LIMITS = {MODEL: {"requests_per_minute": 6, "tokens_per_minute": 600}}
+
+
+class FakeClock:
+    """time module stand-in whose sleep() advances the clock instead of blocking"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def limiter(clock):
+    return rate_limit.RateLimiter(LIMITS)
+
+
+def test_buckets_refill_over_time(limiter, clock):
+    for _ in range(6):
+        assert limiter.try_acquire(MODEL, 100) == 0
+    # Both buckets are empty; one request and 100 tokens come back every 10 seconds
+    assert limiter.try_acquire(MODEL, 100) == pytest.approx(10)
+
+    clock.now += 5
+    assert limiter.try_acquire(MODEL, 100) == pytest.approx(5)
+    clock.now += 5
+    assert limiter.try_acquire(MODEL, 100) == 0
+
+
+def test_refill_stops_at_capacity(limiter, clock):
+    limiter.try_acquire(MODEL, 300)
+    clock.now += 3600
+
+    status = limiter.get_status(MODEL)
+    assert status["requests_available"] == 6
+    assert status["tokens_available"] == 600
+
+
+def test_usage_over_the_reservation_overdraws_the_bucket(limiter):
+    assert limiter.try_acquire(MODEL, 100) == 0
+    # The call used 900 tokens against a 100 token reservation: 500 - 800 leaves the bucket at -300
+    limiter.record_usage(MODEL, 900, reserved_tokens=100)
+
+    # Blocked until the bucket climbs from -300 back to 50, at 10 tokens a second
+    assert limiter.try_acquire(MODEL, 50) == pytest.approx(35)
+
+
+def test_unused_reservation_is_refunded_up_to_capacity(limiter):
+    assert limiter.try_acquire(MODEL, 400) == 0
+    limiter.record_usage(MODEL, 100, reserved_tokens=400)
+    assert limiter.get_status(MODEL)["tokens_available"] == 500
+
+    limiter.record_usage(MODEL, 0, reserved_tokens=1000)
+    assert limiter.get_status(MODEL)["tokens_available"] == 600
+
+
+def test_cooldown_blocks_requests_for_its_duration(limiter, clock):
+    limiter.cooldown(MODEL, 30)
+
+    assert limiter.try_acquire(MODEL) == pytest.approx(30)
+    assert limiter.get_status(MODEL)["status"] == "cooldown"
+    clock.now += 29
+    assert limiter.try_acquire(MODEL) > 0
+    clock.now += 1
+    assert limiter.try_acquire(MODEL) == 0
+
+
+def test_shorter_cooldown_does_not_cut_a_longer_one(limiter):
+    limiter.cooldown(MODEL, 30)
+    limiter.cooldown(MODEL, 5)
+
+    assert limiter.try_acquire(MODEL) == pytest.approx(30)
+
+
+def test_sqlite_stores_share_one_budget(tmp_path, clock):
+    db_path = str(tmp_path / "rate_limit.db")
+    worker_a = rate_limit.RateLimiter(LIMITS, store=rate_limit.SQLiteBucketStore(db_path))
+    worker_b = rate_limit.RateLimiter(LIMITS, store=rate_limit.SQLiteBucketStore(db_path))
+
+    for _ in range(3):
+        assert worker_a.try_acquire(MODEL, 100) == 0
+        assert worker_b.try_acquire(MODEL, 100) == 0
+
+    assert worker_a.try_acquire(MODEL, 100) > 0
+    assert worker_b.try_acquire(MODEL, 100) > 0
+    worker_b.cooldown(MODEL, 60)
+    clock.now += 30
+    assert worker_a.try_acquire(MODEL) == pytest.approx(30)
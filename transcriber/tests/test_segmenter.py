@@ -0,0 +1,42 @@
+import pytest
+
+import segmenter
+
+
+@pytest.fixture
+def ffmpeg(monkeypatch):
+    """Point segmenter at a fake ffmpeg binary and forget any earlier probe"""
+    def use(path):
+        monkeypatch.setattr(segmenter, 'FFMPEG_BINARY', str(path))
+        segmenter.has_encoder.cache_clear()
+        segmenter.segment_format.cache_clear()
+    yield use
+    segmenter.has_encoder.cache_clear()
+    segmenter.segment_format.cache_clear()
+
+
+def fake_ffmpeg(tmp_path, encoders):
+    script = tmp_path / "ffmpeg"
+    script.write_text("#!/bin/sh\ncat <<'EOF'\nEncoders:\n ------\n" + encoders + "EOF\n")
+    script.chmod(0o755)
+    return script
+
+
+def test_opus_is_used_when_available(ffmpeg, tmp_path):
+    ffmpeg(fake_ffmpeg(tmp_path, " A....D libopus              libopus Opus\n A....D aac                  AAC\n"))
+
+    assert segmenter.segment_format() == (segmenter.OPUS_EXTENSION, segmenter.OPUS_CODEC_ARGS)
+
+
+def test_falls_back_to_wav_without_libopus(ffmpeg, tmp_path):
+    ffmpeg(fake_ffmpeg(tmp_path, " A....D aac                  AAC\n A....D opus                 Opus (experimental)\n"))
+
+    assert segmenter.segment_format() == (segmenter.WAV_EXTENSION, segmenter.WAV_CODEC_ARGS)
+    # WAV uploads are not re-encoded into the same format
+    assert segmenter.compress_audio(str(tmp_path / "upload.wav"), str(tmp_path)) is None
+
+
+def test_missing_ffmpeg_has_no_encoders(ffmpeg, tmp_path):
+    ffmpeg(tmp_path / "no-such-ffmpeg")
+
+    assert not segmenter.has_encoder(segmenter.OPUS_ENCODER)
@@ -0,0 +1,58 @@
+import stitching
+
+OVERLAP_SECONDS = 5
+
+
+def words(prefix, count):
+    return [f"{prefix}{i}" for i in range(count)]
+
+
+def spoken(transcript):
+    """Words of a transcript without the speaker labels"""
+    return [word for line in transcript.splitlines() for word in line.split(": ", 1)[1].split()]
+
+
+def test_exact_overlap_is_kept_once():
+    shared = "and that is why we moved the launch to March".split()
+    prev = "Speaker 1: " + " ".join(words("a", 90) + shared)
+    next_ = "Speaker 1: " + " ".join(shared + words("b", 88))
+
+    stitched = stitching.stitch_transcripts([prev, next_], OVERLAP_SECONDS)
+
+    assert spoken(stitched) == words("a", 90) + shared + words("b", 88)
+
+
+def test_no_overlap_concatenates():
+    prev = "Speaker 1: " + " ".join(words("a", 100))
+    next_ = "Speaker 1: " + " ".join(words("b", 98))
+
+    stitched = stitching.stitch_transcripts([prev, next_], OVERLAP_SECONDS)
+
+    assert spoken(stitched) == words("a", 100) + words("b", 98)
+
+
+def test_repeated_phrase_inside_window_is_not_an_overlap():
+    # "you know what" occurs near both edges, but not at the edges themselves
+    prev_words = words("a", 90) + "you know what".split() + words("c", 7)
+    next_words = words("d", 5) + "you know what".split() + words("b", 90)
+    prev = "Speaker 1: " + " ".join(prev_words)
+    next_ = "Speaker 2: " + " ".join(next_words)
+
+    stitched = stitching.stitch_transcripts([prev, next_], OVERLAP_SECONDS)
+
+    assert spoken(stitched) == prev_words + next_words
+    assert stitched.splitlines()[1].startswith("Speaker 2: d0")
+
+
+def test_overlap_remaps_speaker_labels():
+    shared = "so the budget is approved for the next quarter".split()
+    prev = "Speaker 1: hello there\nSpeaker 2: " + " ".join(shared)
+    next_ = "Speaker 1: " + " ".join(shared) + "\nSpeaker 2: great thanks"
+
+    stitched = stitching.stitch_transcripts([prev, next_], OVERLAP_SECONDS)
+
+    assert stitched.splitlines() == [
+        "Speaker 1: hello there",
+        "Speaker 2: " + " ".join(shared),
+        "Speaker 3: great thanks",
+    ]
@@ -0,0 +1,54 @@
+import hashlib
+
+import pytest
+
+import transcript_store
+
+mongomock = pytest.importorskip("mongomock")
+
+
+def digest(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def save(collection, text):
+    collection.update_one({'user_id': 'u', 'transcript_id': 't'},
+                          {'$set': {'transcript': text, 'digest': digest(text)}}, upsert=True)
+
+
+@pytest.fixture
+def collection():
+    return mongomock.MongoClient().db.transcripts
+
+
+def test_edit_through_another_worker_is_seen(collection):
+    save(collection, "Speaker 1: first draft")
+    worker = transcript_store.TranscriptStore(collection, digest)
+    assert worker.get('t', 'u') == "Speaker 1: first draft"
+
+    # Another worker saves and invalidates only its own cache
+    save(collection, "Speaker 1: edited")
+    transcript_store.TranscriptStore(collection, digest).invalidate('t', 'u')
+
+    assert worker.get('t', 'u') == "Speaker 1: edited"
+
+
+def test_delete_through_another_worker_is_seen(collection):
+    save(collection, "Speaker 1: hello")
+    worker = transcript_store.TranscriptStore(collection, digest)
+    worker.put('t', 'u', "Speaker 1: hello")
+
+    collection.delete_one({'user_id': 'u', 'transcript_id': 't'})
+
+    assert worker.get('t', 'u') is None
+    assert not worker.cache
+
+
+def test_unchanged_transcript_is_served_from_memory(collection):
+    save(collection, "Speaker 1: hello")
+    worker = transcript_store.TranscriptStore(collection, digest)
+    worker.get('t', 'u')
+    # While the digest matches, only it is read back and the cached text is reused
+    collection.update_one({'transcript_id': 't'}, {'$set': {'transcript': "changed behind the digest"}})
+
+    assert worker.get('t', 'u') == "Speaker 1: hello"
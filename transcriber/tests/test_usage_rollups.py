@@ -0,0 +1,172 @@
+import datetime
+
+import pytest
+
+import api_cost
+import db_indexes
+import usage_rollups
+
+MODEL = "gemini-2.0-flash"
+NEXT_PRICE_VERSION = "2099-01"
+# Rebuilt calls must be newer than the api_calls TTL, which mongomock enforces
+RECENT_DAY = usage_rollups.bucket_start(datetime.datetime.utcnow(), 'day') - datetime.timedelta(days=7)
+
+
+def call(when, request_type='qa', prompt_tokens=1000, response_tokens=200, **fields):
+    return dict({'user_id': 'user-1', 'request_type': request_type, 'model_version': MODEL,
+                 'prompt_tokens': prompt_tokens, 'response_tokens': response_tokens,
+                 'total_token_count': prompt_tokens + response_tokens, 'datetime': when}, **fields)
+
+
+def buckets(db, granularity, collection='usage_rollups'):
+    """{bucket start: rollup document without its _id} for one granularity"""
+    return {doc['bucket']: doc for doc in db[collection].find({'granularity': granularity}, {'_id': 0})}
+
+
+@pytest.fixture
+def db(mongo_db):
+    db_indexes.ensure_indexes(mongo_db)
+    return mongo_db
+
+
+@pytest.fixture
+def price_tables(monkeypatch):
+    """A second price table, twice the current prices"""
+    current = api_cost.PRICE_TABLES[api_cost.CURRENT_PRICE_VERSION]
+    doubled = {model: {side: price * 2 for side, price in prices.items()} for model, prices in current.items()}
+    monkeypatch.setitem(api_cost.PRICE_TABLES, NEXT_PRICE_VERSION, doubled)
+
+
+def test_calls_fall_into_hour_and_day_buckets(db):
+    usage_rollups.apply_rollups(db, [
+        call(datetime.datetime(2025, 3, 31, 22, 59, 59)),
+        call(datetime.datetime(2025, 3, 31, 23, 0, 0)),
+        call(datetime.datetime(2025, 4, 1, 0, 0, 0)),
+    ])
+
+    hours = buckets(db, 'hour')
+    assert {bucket: doc['requests'] for bucket, doc in hours.items()} == {
+        datetime.datetime(2025, 3, 31, 22): 1,
+        datetime.datetime(2025, 3, 31, 23): 1,
+        datetime.datetime(2025, 4, 1, 0): 1,
+    }
+    days = buckets(db, 'day')
+    assert {bucket: doc['requests'] for bucket, doc in days.items()} == {
+        datetime.datetime(2025, 3, 31): 2,
+        datetime.datetime(2025, 4, 1): 1,
+    }
+    assert days[datetime.datetime(2025, 3, 31)]['price_version'] == api_cost.CURRENT_PRICE_VERSION
+    assert days[datetime.datetime(2025, 3, 31)]['cost'] == pytest.approx(2 * api_cost.calculate_cost(MODEL, 1000, 200))
+
+
+def test_cache_hits_are_not_requests(db):
+    when = datetime.datetime(2025, 4, 2, 9, 30)
+    usage_rollups.apply_rollups(db, [
+        call(when, cache_hit=False),
+        call(when, prompt_tokens=0, response_tokens=0, cache_hit=True, tokens_saved=1200),
+        call(when, request_type='transcription'),
+    ])
+
+    day = buckets(db, 'day')[datetime.datetime(2025, 4, 2)]
+    assert day['requests'] == 2
+    assert day['cache_hits'] == 1
+    assert day['cache_misses'] == 1
+    assert day['tokens_saved'] == 1200
+    assert day['requests_by_type'] == {'qa': 1, 'transcription': 1}
+
+    usage = usage_rollups.get_usage(db, 'user-1', datetime.datetime(2025, 4, 1))
+    assert usage['requests'] == 2
+    assert usage['response_cache'] == {'hits': 1, 'hit_rate': 0.5, 'tokens_saved': 1200}
+
+
+def test_month_range_wraps_at_december():
+    assert usage_rollups.month_range(2024, 12) == (datetime.datetime(2024, 12, 1), datetime.datetime(2025, 1, 1))
+    assert usage_rollups.month_range(2025, 1) == (datetime.datetime(2025, 1, 1), datetime.datetime(2025, 2, 1))
+    assert usage_rollups.month_range(2025, 11) == (datetime.datetime(2025, 11, 1), datetime.datetime(2025, 12, 1))
+
+
+def test_rebuild_matches_live_rollups(db):
+    calls = [call(RECENT_DAY + datetime.timedelta(days=day, hours=hour)) for day in (0, 1, 2) for hour in (0, 12, 23)]
+    db.api_calls.insert_many([dict(c) for c in calls])
+    usage_rollups.apply_rollups(db, calls)
+    live = buckets(db, 'hour'), buckets(db, 'day')
+
+    # The oldest day may be partly expired, so its live buckets are carried over, not recounted
+    assert usage_rollups.rebuild_rollups(db) == 6
+
+    assert (buckets(db, 'hour'), buckets(db, 'day')) == live
+    assert db.rollup_checkpoints.count_documents({}) == 0
+
+
+def test_interrupted_rebuild_replays_a_day_without_double_counting(db, monkeypatch):
+    calls = [call(RECENT_DAY + datetime.timedelta(days=day, hours=hour)) for day in (0, 1, 2) for hour in (0, 12)]
+    db.api_calls.insert_many([dict(c) for c in calls])
+    usage_rollups.apply_rollups(db, calls)
+    live = buckets(db, 'day')
+
+    # Crash after the first day is written to staging but before its checkpoint advances
+    collection_class = type(db.rollup_checkpoints)
+    update_one = collection_class.update_one
+
+    def crash(collection, *args, **kwargs):
+        if collection.name == 'rollup_checkpoints':
+            raise RuntimeError("worker killed")
+        return update_one(collection, *args, **kwargs)
+
+    monkeypatch.setattr(collection_class, 'update_one', crash)
+    with pytest.raises(RuntimeError):
+        usage_rollups.rebuild_rollups(db)
+    # The carried-over oldest day and the first rebuilt one
+    assert len(buckets(db, 'day', usage_rollups.REBUILD_COLLECTION)) == 2
+    monkeypatch.setattr(collection_class, 'update_one', update_one)
+
+    usage_rollups.rebuild_rollups(db)
+
+    assert buckets(db, 'day') == live
+
+
+def test_reprice_to_another_table_and_back(db, price_tables):
+    calls = [call(datetime.datetime(2025, 6, 1, hour), prompt_tokens=100 * hour) for hour in range(1, 5)]
+    usage_rollups.apply_rollups(db, calls)
+    original = buckets(db, 'day')[datetime.datetime(2025, 6, 1)]
+
+    assert usage_rollups.reprice_rollups(db, NEXT_PRICE_VERSION) == 5
+    repriced = buckets(db, 'day')[datetime.datetime(2025, 6, 1)]
+    assert repriced['price_version'] == NEXT_PRICE_VERSION
+    assert repriced['cost'] == pytest.approx(original['cost'] * 2)
+    assert repriced['requests'] == original['requests']
+    assert repriced['prompt_tokens'] == original['prompt_tokens']
+
+    usage_rollups.reprice_rollups(db, api_cost.CURRENT_PRICE_VERSION)
+    restored = buckets(db, 'day')[datetime.datetime(2025, 6, 1)]
+    assert restored['price_version'] == api_cost.CURRENT_PRICE_VERSION
+    assert restored['cost'] == pytest.approx(original['cost'])
+    assert restored['requests_by_type'] == original['requests_by_type']
+    assert db.usage_rollups.count_documents({}) == 5
+
+
+def test_repriced_bucket_merges_into_an_existing_one(db, price_tables):
+    # Calls rolled up live under the new table while old buckets still wait to be re-priced
+    when = datetime.datetime(2025, 6, 2, 10)
+    usage_rollups.apply_rollups(db, [call(when)])
+    db.usage_rollups.update_many({}, {'$set': {'price_version': NEXT_PRICE_VERSION}})
+    usage_rollups.apply_rollups(db, [call(when)])
+
+    usage_rollups.reprice_rollups(db, NEXT_PRICE_VERSION)
+
+    day = buckets(db, 'day')[datetime.datetime(2025, 6, 2)]
+    assert day['requests'] == 2
+    assert db.usage_rollups.count_documents({'granularity': 'day'}) == 1
+
+
+def test_replayed_reprice_batch_is_not_counted_twice(db, price_tables):
+    usage_rollups.apply_rollups(db, [call(datetime.datetime(2025, 6, 3, 8))])
+    docs = list(db.usage_rollups.find())
+
+    usage_rollups.reprice_batch(db, docs, NEXT_PRICE_VERSION)
+    # Re-running the batch, e.g. after a crash before its deletes, must not add the counters again
+    usage_rollups.reprice_batch(db, docs, NEXT_PRICE_VERSION)
+
+    day = buckets(db, 'day')[datetime.datetime(2025, 6, 3)]
+    assert day['requests'] == 1
+    assert day['cost'] == pytest.approx(2 * api_cost.calculate_cost(MODEL, 1000, 200))
@@ -0,0 +1,63 @@
+"""
+Content-addressed transcript cache.
+
+Transcripts are keyed on the MD5 of the uploaded audio together with the model and
+prompt version used, so re-uploading the same recording skips transcription.
+Entries expire through a MongoDB TTL index (see db_indexes.py).
+"""
+
+import datetime
+import logging
+
+logger = logging.getLogger('transcriber')
+
+
+def get_cached_transcript(db, content_hash, model, prompt_version):
+    """Return the cached transcript document or None"""
+    return db.transcript_cache.find_one({
+        'content_hash': content_hash,
+        'model': model,
+        'prompt_version': prompt_version
+    })
+
+
+def store_transcript(db, content_hash, model, prompt_version, transcript, token_usage):
+    """Store (or refresh) a transcript in the cache"""
+    db.transcript_cache.update_one(
+        {
+            'content_hash': content_hash,
+            'model': model,
+            'prompt_version': prompt_version
+        },
+        {
+            '$set': {
+                'transcript': transcript,
+                'token_usage': token_usage,
+                'created_at': datetime.datetime.utcnow()
+            }
+        },
+        upsert=True
+    )
+
+
+def record_cache_event(db, user_id, hit, tokens_saved=0):
+    """Increment the hit or miss counter for a user"""
+    update = {'$inc': {'hits' if hit else 'misses': 1}}
+    if hit and tokens_saved:
+        update['$inc']['tokens_saved'] = tokens_saved
+    update['$set'] = {'updated_at': datetime.datetime.utcnow()}
+    db.transcript_cache_stats.update_one({'user_id': user_id}, update, upsert=True)
+
+
+def get_cache_stats(db, user_id):
+    """Return hit/miss counters for a user"""
+    stats = db.transcript_cache_stats.find_one({'user_id': user_id}) or {}
+    hits = stats.get('hits', 0)
+    misses = stats.get('misses', 0)
+    lookups = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / lookups if lookups else 0.0,
+        'tokens_saved': stats.get('tokens_saved', 0)
+    }
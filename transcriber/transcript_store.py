@@ -0,0 +1,63 @@
+"""
+Server-side transcript lookup with an in-process LRU cache in front of MongoDB.
+
+Transcripts live in the transcripts collection keyed by transcript_id; the Flask
+session only carries ids, so request size does not grow with transcript length.
+
+Every worker process has its own cache, so a cached text is only returned after
+checking it against the digest stored in MongoDB. That check reads a few bytes
+through the (user_id, transcript_id) index instead of the whole transcript, and
+edits or deletes made through any worker are seen by all of them.
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class TranscriptStore:
+    """Fetch transcript text by id, keeping the most recently used ones in memory."""
+
+    def __init__(self, collection, digest, max_entries=32):
+        self.collection = collection
+        # Function returning the digest saved with a transcript's text (user_auth.transcript_digest)
+        self.digest = digest
+        self.max_entries = max_entries
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, transcript_id, user_id):
+        """Return the transcript text for a user's transcript, or None if it doesn't exist"""
+        key = (user_id, transcript_id)
+        query = {'user_id': user_id, 'transcript_id': transcript_id}
+        with self.lock:
+            cached = self.cache.get(key)
+        if cached:
+            current = self.collection.find_one(query, {'digest': 1, '_id': 0})
+            if current and current.get('digest') == cached[0]:
+                with self.lock:
+                    if key in self.cache:
+                        self.cache.move_to_end(key)
+                return cached[1]
+            # Changed or deleted, possibly by another worker
+            self.invalidate(transcript_id, user_id)
+            if not current:
+                return None
+
+        doc = self.collection.find_one(query, {'transcript': 1, '_id': 0})
+        if not doc or not doc.get('transcript'):
+            return None
+        self.put(transcript_id, user_id, doc['transcript'])
+        return doc['transcript']
+
+    def put(self, transcript_id, user_id, transcript):
+        """Add a transcript to the front cache (it must already be saved in MongoDB)"""
+        with self.lock:
+            self.cache[(user_id, transcript_id)] = (self.digest(transcript), transcript)
+            self.cache.move_to_end((user_id, transcript_id))
+            while len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+
+    def invalidate(self, transcript_id, user_id):
+        """Drop a transcript from this process's cache (other workers revalidate on read)"""
+        with self.lock:
+            self.cache.pop((user_id, transcript_id), None)
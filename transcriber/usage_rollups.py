@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+"""
+Hourly and daily usage rollups per user and model.
+
+Every batch of api_calls documents written by the telemetry writer is folded into
+usage_rollups buckets with $inc upserts, so questions like "spend this month" read a
+handful of bucket documents instead of scanning api_calls. The price table version is
+part of the bucket key, so a bucket never mixes costs priced under different tables.
+
+Rollups can be rebuilt from api_calls (resumable, run with the app stopped; buckets
+older than the api_calls retention window are kept), or re-priced by
+merging every bucket into the same bucket under another api_cost price table:
+
+    python usage_rollups.py rebuild
+    python usage_rollups.py reprice --price-version 2024-01
+"""
+
+import datetime
+import logging
+from collections import defaultdict
+
+import click
+import numpy as np
+from pymongo import UpdateOne, DeleteOne
+from pymongo.errors import BulkWriteError
+
+import api_cost
+import db_indexes
+
+logger = logging.getLogger('transcriber')
+
+GRANULARITIES = ('hour', 'day')
+REBUILD_BATCH_SIZE = 1000
+REPRICE_BATCH_SIZE = 50000
+CHECKPOINT_ID = 'usage_rollups_rebuild'
+# Fields identifying a bucket (everything else is a counter)
+BUCKET_FIELDS = ('_id', 'user_id', 'model', 'granularity', 'bucket', 'price_version', 'merged_from')
+# Rebuilt rollups are written here and renamed over usage_rollups when complete
+REBUILD_COLLECTION = 'usage_rollups_rebuild'
+
+
+def bucket_start(timestamp, granularity):
+    """Truncate a datetime to the start of its hour or day"""
+    if granularity == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def aggregate_calls(calls):
+    """Sum api_calls documents per bucket: {(user_id, model, granularity, bucket): {field: value}}"""
+    totals = defaultdict(lambda: defaultdict(int))
+    for call in calls:
+        model = call.get('model_version') or api_cost.DEFAULT_MODEL
+        prompt_tokens = call.get('prompt_tokens') or 0
+        response_tokens = call.get('response_tokens') or 0
+        cost = api_cost.calculate_cost(model, prompt_tokens, response_tokens)
+        for granularity in GRANULARITIES:
+            key = (call.get('user_id'), model, granularity, bucket_start(call['datetime'], granularity))
+            bucket = totals[key]
+            if call.get('cache_hit'):
+                # Answered from the response cache: no API request was made
+                bucket['cache_hits'] += 1
+                bucket['tokens_saved'] += call.get('tokens_saved') or 0
+                continue
+            if call.get('cache_hit') is False:
+                bucket['cache_misses'] += 1
+            bucket['requests'] += 1
+            bucket['prompt_tokens'] += prompt_tokens
+            bucket['response_tokens'] += response_tokens
+            bucket['total_tokens'] += call.get('total_token_count') or 0
+            bucket['cost'] += cost
+            bucket[f"requests_by_type.{call.get('request_type', 'unknown')}"] += 1
+    return totals
+
+
+def bucket_filter(key, price_version):
+    user_id, model, granularity, bucket = key
+    return {'user_id': user_id, 'model': model, 'granularity': granularity, 'bucket': bucket,
+            'price_version': price_version}
+
+
+def build_rollup_updates(calls):
+    """Aggregate api_calls documents in memory and return one upsert per touched bucket"""
+    return [
+        UpdateOne(bucket_filter(key, api_cost.CURRENT_PRICE_VERSION), {'$inc': dict(values)}, upsert=True)
+        for key, values in aggregate_calls(calls).items()
+    ]
+
+
+def apply_rollups(db, calls):
+    """Fold a batch of api_calls documents into the rollup collection"""
+    updates = build_rollup_updates(calls)
+    if updates:
+        db.usage_rollups.bulk_write(updates, ordered=False)
+
+
+def get_usage(db, user_id, start, end=None, granularity='day'):
+    """Sum rollup buckets in [start, end) per model for a user"""
+    query = {'user_id': user_id, 'granularity': granularity, 'bucket': {'$gte': start}}
+    if end is not None:
+        query['bucket']['$lt'] = end
+
+    models = defaultdict(lambda: defaultdict(float))
+    projection = {'_id': 0, 'user_id': 0, 'granularity': 0, 'bucket': 0, 'price_version': 0, 'merged_from': 0}
+    for doc in db.usage_rollups.find(query, projection):
+        totals = models[doc.pop('model')]
+        for field, value in doc.items():
+            if isinstance(value, dict):
+                for sub_field, sub_value in value.items():
+                    totals[f"{field}.{sub_field}"] += sub_value
+            else:
+                totals[field] += value
+
+    cache_hits = int(sum(m['cache_hits'] for m in models.values()))
+    cache_lookups = cache_hits + int(sum(m['cache_misses'] for m in models.values()))
+    return {
+        'total_cost': sum(m['cost'] for m in models.values()),
+        'total_tokens': int(sum(m['total_tokens'] for m in models.values())),
+        'requests': int(sum(m['requests'] for m in models.values())),
+        'response_cache': {
+            'hits': cache_hits,
+            'hit_rate': cache_hits / cache_lookups if cache_lookups else 0.0,
+            'tokens_saved': int(sum(m['tokens_saved'] for m in models.values()))
+        },
+        'models': {model: dict(totals) for model, totals in models.items()}
+    }
+
+
+def month_range(year, month):
+    """Return the [start, end) datetimes of a calendar month"""
+    start = datetime.datetime(year, month, 1)
+    end = datetime.datetime(year + month // 12, month % 12 + 1, 1)
+    return start, end
+
+
+def rebuild_rollups(db, batch_size=REBUILD_BATCH_SIZE):
+    """
+    Recompute all rollups from api_calls into a staging collection, then swap it in.
+
+    api_calls are rolled up one day at a time and each day's buckets are written whole
+    with $set, so replaying a day after an interruption gives the same result; the
+    checkpoint records the next day to roll up. Buckets from before the oldest api_calls
+    still kept (see db_indexes.API_CALLS_RETENTION_DAYS) are carried over unchanged.
+    """
+    staging = db[REBUILD_COLLECTION]
+    checkpoint = db.rollup_checkpoints.find_one({'_id': CHECKPOINT_ID})
+    if checkpoint is None:
+        last = db.api_calls.find_one(sort=[('_id', -1)], projection={'_id': 1})
+        if last is None:
+            return 0
+        oldest = db.api_calls.find_one(sort=[('datetime', 1)], projection={'datetime': 1})
+        newest = db.api_calls.find_one(sort=[('datetime', -1)], projection={'datetime': 1})
+        first_day = bucket_start(oldest['datetime'], 'day')
+        # The oldest day is partly expired by the api_calls TTL; keep its existing buckets if there are any
+        if db.usage_rollups.find_one({'granularity': 'day', 'bucket': first_day}, {'_id': 1}):
+            first_day += datetime.timedelta(days=1)
+
+        staging.drop()
+        for keys, options in db_indexes.INDEXES['usage_rollups']:
+            staging.create_index(keys, **options)
+        # Older buckets can't be recomputed once their api_calls have expired
+        db.usage_rollups.aggregate([
+            {'$match': {'bucket': {'$lt': first_day}}},
+            {'$merge': {'into': REBUILD_COLLECTION, 'whenMatched': 'replace', 'whenNotMatched': 'insert'}}
+        ])
+        # Only documents that existed when the rebuild started; newer ones are rolled up live
+        checkpoint = {
+            '_id': CHECKPOINT_ID,
+            'upper_id': last['_id'],
+            'next_day': first_day,
+            'last_day': bucket_start(newest['datetime'], 'day')
+        }
+        db.rollup_checkpoints.insert_one(checkpoint)
+
+    processed = 0
+    day = checkpoint['next_day']
+    while day <= checkpoint['last_day']:
+        next_day = day + datetime.timedelta(days=1)
+        calls = db.api_calls.find(
+            {'datetime': {'$gte': day, '$lt': next_day}, '_id': {'$lte': checkpoint['upper_id']}},
+            batch_size=batch_size
+        )
+        totals = aggregate_calls(calls)
+        if totals:
+            staging.bulk_write([
+                UpdateOne(bucket_filter(key, api_cost.CURRENT_PRICE_VERSION), {'$set': dict(values)}, upsert=True)
+                for key, values in totals.items()
+            ], ordered=False)
+        db.rollup_checkpoints.update_one({'_id': CHECKPOINT_ID}, {'$set': {'next_day': next_day}})
+        processed += sum(values['requests'] + values['cache_hits']
+                         for key, values in totals.items() if key[2] == 'day')
+        logger.info(f"Rolled up {processed} api calls (through {day.date()})")
+        day = next_day
+
+    # Without a checkpoint, a crash before the rename restarts the rebuild from scratch
+    db.rollup_checkpoints.delete_one({'_id': CHECKPOINT_ID})
+    staging.rename('usage_rollups', dropTarget=True)
+    return processed
+
+
+def counter_fields(doc, prefix=''):
+    """Flatten a rollup document's counters into {dotted field: value}"""
+    fields = {}
+    for field, value in doc.items():
+        if field in BUCKET_FIELDS:
+            continue
+        if isinstance(value, dict):
+            fields.update(counter_fields(value, f"{prefix}{field}."))
+        else:
+            fields[f"{prefix}{field}"] = value
+    return fields
+
+
+def reprice_batch(db, docs, price_version):
+    """
+    Re-price one batch of rollup documents column-wise and move them to price_version.
+
+    Each bucket's counters, with its cost recomputed, are added to the bucket of the same
+    key under price_version, and the old bucket is deleted. The $inc only matches a target
+    that hasn't absorbed this bucket yet (merged_from), so a batch interrupted between the
+    two writes can be re-run without double counting.
+    """
+    costs = api_cost.calculate_costs(
+        [doc['model'] for doc in docs],
+        np.fromiter((doc.get('prompt_tokens', 0) for doc in docs), dtype=np.float64, count=len(docs)),
+        np.fromiter((doc.get('response_tokens', 0) for doc in docs), dtype=np.float64, count=len(docs)),
+        price_version
+    )
+    merges = []
+    for doc, cost in zip(docs, costs):
+        key = (doc['user_id'], doc['model'], doc['granularity'], doc['bucket'])
+        merges.append(UpdateOne(
+            dict(bucket_filter(key, price_version), merged_from={'$ne': doc['_id']}),
+            {'$inc': dict(counter_fields(doc), cost=float(cost)), '$addToSet': {'merged_from': doc['_id']}},
+            upsert=True
+        ))
+    try:
+        db.usage_rollups.bulk_write(merges, ordered=False)
+    except BulkWriteError as e:
+        # A duplicate key means the target bucket already absorbed this one
+        if any(error['code'] != 11000 for error in e.details['writeErrors']):
+            raise
+    db.usage_rollups.bulk_write([DeleteOne({'_id': doc['_id']}) for doc in docs], ordered=False)
+
+
+def reprice_rollups(db, price_version=None, batch_size=REPRICE_BATCH_SIZE):
+    """Recompute the cost of every rollup bucket under a price table version"""
+    price_version = price_version or api_cost.CURRENT_PRICE_VERSION
+    if price_version not in api_cost.PRICE_TABLES:
+        raise ValueError(f"Unknown price version: {price_version}")
+
+    cursor = db.usage_rollups.find({'price_version': {'$ne': price_version}}, batch_size=batch_size)
+    processed = 0
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            reprice_batch(db, batch, price_version)
+            processed += len(batch)
+            logger.info(f"Re-priced {processed} rollup buckets")
+            batch = []
+    if batch:
+        reprice_batch(db, batch, price_version)
+        processed += len(batch)
+    return processed
+
+
+@click.group()
+def cli():
+    """Maintain usage rollups for the Transcriber app"""
+
+
+@cli.command()
+@click.option('--batch-size', default=REBUILD_BATCH_SIZE, type=int, help='api_calls documents per batch')
+def rebuild(batch_size):
+    """Rebuild usage_rollups from api_calls (resumes an interrupted rebuild)"""
+    import user_auth
+    count = rebuild_rollups(user_auth.db, batch_size=batch_size)
+    click.echo(f"Rolled up {count} api calls")
+
+
+@cli.command()
+@click.option('--price-version', default=api_cost.CURRENT_PRICE_VERSION, show_default=True,
+              type=click.Choice(sorted(api_cost.PRICE_TABLES)), help='Price table to apply')
+@click.option('--batch-size', default=REPRICE_BATCH_SIZE, type=int, help='Rollup buckets per batch')
+def reprice(price_version, batch_size):
+    """Re-price usage_rollups under a price table version"""
+    import user_auth
+    count = reprice_rollups(user_auth.db, price_version=price_version, batch_size=batch_size)
+    click.echo(f"Re-priced {count} rollup buckets")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    cli()
@@ -3,8 +3,12 @@ import os
 import uuid
 from functools import wraps
 from flask import session, redirect, url_for, flash, request, g
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError
 import datetime
+import base64
+from bson import ObjectId
+import db_indexes
 
 # Initialize MongoDB connection with environment variables for flexibility
 MONGO_HOST = os.environ.get('MONGO_HOST', 'localhost')
@@ -38,11 +42,19 @@ except Exception as e:
 users_collection = db.users
 transcripts_collection = db.transcripts
 
+# Length of the transcript preview stored with each transcript for list views
+PREVIEW_LENGTH = 100
+# Fields returned by the paginated transcript listing
+TRANSCRIPT_LIST_PROJECTION = {'transcript_id': 1, 'title': 1, 'created_at': 1, 'preview': 1, 'has_summary': 1}
+# Transcripts backfilled with a digest per bulk write
+DIGEST_BACKFILL_BATCH_SIZE = 500
+# Chunk embeddings are only read for question answering
+WITHOUT_RETRIEVAL_INDEX = {'retrieval': 0}
+
 def init_db(app):
     """Initialize the database and ensure indexes"""
-    # Add indexes to improve query performance
-    users_collection.create_index('email', unique=True)
-    users_collection.create_index('username', unique=True)
+    # Add indexes to improve query performance (declared in db_indexes.py)
+    db_indexes.ensure_indexes(db)
     
     # Store MongoDB connection in app config
     app.config['MONGO_CLIENT'] = client
@@ -65,10 +77,6 @@ def hash_password(password, salt=None):
 
 def register_user(username, email, password):
     """Register a new user"""
-    # Check if username or email already exists
-    if users_collection.find_one({'$or': [{'username': username}, {'email': email}]}):
-        return False, "Username or email already exists"
-    
     # Hash password with salt
     password_hash, salt = hash_password(password)
     
@@ -83,8 +91,11 @@ def register_user(username, email, password):
         'sessions': []
     }
     
-    # Insert into database
-    users_collection.insert_one(user)
+    # The unique username/email indexes reject duplicates, so no separate lookup is needed
+    try:
+        users_collection.insert_one(user)
+    except DuplicateKeyError:
+        return False, "Username or email already exists"
     return True, "User registered successfully"
 
 def authenticate_user(email, password):
@@ -144,56 +155,124 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
-def get_user_transcripts(user_id):
-    """Get all transcripts for a user"""
+def make_preview(transcript):
+    """Return the short preview stored alongside a transcript"""
+    return transcript[:PREVIEW_LENGTH] + '...' if len(transcript) > PREVIEW_LENGTH else transcript
+
+
+def backfill_transcript_previews():
+    """Add preview/has_summary fields to transcripts saved before they existed (see migrations.py)"""
+    result = transcripts_collection.update_many(
+        {'preview': {'$exists': False}},
+        [{'$set': {
+            'preview': {'$cond': [
+                {'$gt': [{'$strLenCP': {'$ifNull': ['$transcript', '']}}, PREVIEW_LENGTH]},
+                {'$concat': [{'$substrCP': ['$transcript', 0, PREVIEW_LENGTH]}, '...']},
+                {'$ifNull': ['$transcript', '']}
+            ]},
+            'has_summary': {'$gt': [{'$strLenCP': {'$ifNull': ['$summary', '']}}, 0]}
+        }}]
+    )
+    if result.modified_count:
+        print(f"Backfilled previews for {result.modified_count} transcripts")
+
+
+def transcript_digest(transcript):
+    """Return the SHA-256 hex digest identifying a transcript's text"""
+    return hashlib.sha256((transcript or '').encode('utf-8')).hexdigest()
+
+
+def backfill_transcript_digests():
+    """Add the digest field to transcripts saved before it existed (see migrations.py)"""
+    updated = 0
+    batch = []
+    for doc in transcripts_collection.find({'digest': {'$exists': False}}, {'transcript': 1}):
+        batch.append(UpdateOne({'_id': doc['_id']}, {'$set': {'digest': transcript_digest(doc.get('transcript'))}}))
+        if len(batch) >= DIGEST_BACKFILL_BATCH_SIZE:
+            updated += transcripts_collection.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    if batch:
+        updated += transcripts_collection.bulk_write(batch, ordered=False).modified_count
+    if updated:
+        print(f"Backfilled digests for {updated} transcripts")
+
+
+def encode_cursor(doc):
+    """Encode the sort position of a transcript as an opaque page cursor"""
+    raw = f"{doc['created_at'].isoformat()}|{doc['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Decode a page cursor; raises ValueError if it is malformed"""
     try:
-        # Add explicit sorting by created_at in descending order (newest first)
-        return list(transcripts_collection.find(
-            {'user_id': user_id}
-        ).sort("created_at", -1))
+        created_at, object_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.datetime.fromisoformat(created_at), ObjectId(object_id)
     except Exception as e:
-        print(f"Error retrieving transcripts: {e}")
-        # Return empty list on error instead of failing
-        return []
-    
+        raise ValueError(f"Invalid cursor: {cursor}") from e
 
-def save_user_transcript(user_id, transcript_data):
-    if transcript_data.get('transcript'):
-        first_line = transcript_data['transcript'].split('\n')[0][:40]
+
+def get_user_transcript_page(user_id, limit=50, cursor=None):
+    """
+    Get one page of a user's transcripts, newest first, without the transcript bodies.
+
+    Returns (transcripts, next_cursor); next_cursor is None on the last page.
+    """
+    query = {'user_id': user_id}
+    if cursor:
+        created_at, object_id = decode_cursor(cursor)
+        query['$or'] = [
+            {'created_at': {'$lt': created_at}},
+            {'created_at': created_at, '_id': {'$lt': object_id}}
+        ]
+    # Fetch one extra document to know whether another page follows
+    docs = list(transcripts_collection.find(query, TRANSCRIPT_LIST_PROJECTION)
+                .sort([('created_at', -1), ('_id', -1)])
+                .limit(limit + 1))
+    next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+    return docs[:limit], next_cursor
+
+
+def build_transcript_upsert(user_id, transcript_data):
+    """Return the (filter, update) pair that creates or refreshes a transcript in one write"""
+    text = transcript_data.get('transcript', '')
+    default_title = ''
+    if text:
+        first_line = text.split('\n')[0][:40]
         if first_line:
             # Remove speaker labels if present
             default_title = first_line.split(': ', 1)[-1] if ':' in first_line else first_line
 
-    # Create the transcript document
-    transcript = {
+    query = {
         'user_id': user_id,
-        'transcript': transcript_data.get('transcript', ''),
-        'audioUrl': transcript_data.get('audioUrl', ''),
-        'summary': transcript_data.get('summary', ''),
-        'created_at': datetime.datetime.utcnow(),
-        'transcript_id': transcript_data.get('transcript_id', str(uuid.uuid4())),
-        'title': transcript_data.get('title', default_title)
+        'transcript_id': transcript_data.get('transcript_id') or str(uuid.uuid4())
     }
+    update = {
+        '$set': {
+            'transcript': text,
+            'audioUrl': transcript_data.get('audioUrl', ''),
+            'summary': transcript_data.get('summary', ''),
+            'title': transcript_data.get('title', default_title),
+            'preview': make_preview(text),
+            'digest': transcript_digest(text),
+            'has_summary': bool(transcript_data.get('summary'))
+        },
+        # Only set on insert, so updates keep their place in the newest-first listing
+        '$setOnInsert': {'created_at': datetime.datetime.utcnow()}
+    }
+    return query, update
 
-    # Check if this transcript already exists
-    existing = transcripts_collection.find_one({
-        'user_id': user_id,
-        'transcript_id': transcript['transcript_id']
-    })
 
-    if existing:
-        # Update existing transcript but preserve created_at to maintain sort order
-        if existing.get('created_at'):
-            transcript['created_at'] = existing['created_at']
-        result = transcripts_collection.update_one(
-            {'_id': existing['_id']},
-            {'$set': transcript}
-        )
-        return str(existing['_id'])
-    else:
-        # Insert new transcript
-        result = transcripts_collection.insert_one(transcript)
-        return str(result.inserted_id)
+def save_user_transcript(user_id, transcript_data):
+    """Create or update a transcript in a single round-trip and return its document id"""
+    query, update = build_transcript_upsert(user_id, transcript_data)
+    doc = transcripts_collection.find_one_and_update(
+        query, update,
+        projection={'_id': 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return str(doc['_id'])
 
 
 def update_transcript_summary(user_id, transcript_id, summary):
@@ -205,27 +284,40 @@ def update_transcript_summary(user_id, transcript_id, summary):
         },
         {
             '$set': {
-                'summary': summary
+                'summary': summary,
+                'has_summary': bool(summary)
             }
         }
     )
     return result.modified_count > 0
 
 
-def update_transcript_title(user_id, transcript_id, title):
-    """Update the title of a transcript"""
-    transcripts = transcripts_collection.find_one({
-        'user_id': user_id,
-        'transcript_id': transcript_id
-    })
-    if not transcripts:
-        print(f"Transcript with ID {transcript_id} not found for user {user_id}")
-        return False
-    if transcripts.get('title') == title:
-        print(f"Transcript title is already set to {title}")
-        return True
+def attach_transcript_summary(user_id, summary, title, transcript_id=None, digest=None):
+    """
+    Store a summary and title on a user's transcript, found by id or else by digest.
 
-    result = transcripts_collection.update_one(
+    Both lookups use the (user_id, transcript_id) and (user_id, digest) indexes; when
+    several transcripts share a digest the newest one gets the summary.
+    Returns the transcript_id that was updated, or None if nothing matched.
+    """
+    update = {'$set': {'summary': summary, 'title': title, 'has_summary': bool(summary)}}
+    for query in ({'transcript_id': transcript_id}, {'digest': digest}):
+        if not next(iter(query.values())):
+            continue
+        doc = transcripts_collection.find_one_and_update(
+            dict(query, user_id=user_id),
+            update,
+            projection={'transcript_id': 1},
+            sort=[('created_at', -1)]
+        )
+        if doc:
+            return doc.get('transcript_id')
+    return None
+
+
+def update_transcript_title(user_id, transcript_id, title):
+    """Update the title of a transcript; returns False if the transcript does not exist"""
+    previous = transcripts_collection.find_one_and_update(
         {
             'user_id': user_id,
             'transcript_id': transcript_id
@@ -234,13 +326,16 @@ def update_transcript_title(user_id, transcript_id, title):
             '$set': {
                 'title': title
             }
-        }
+        },
+        projection={'title': 1},
+        return_document=ReturnDocument.BEFORE
     )
+    if not previous:
+        print(f"Transcript with ID {transcript_id} not found for user {user_id}")
+        return False
 
     print(f"Updated transcript title for {transcript_id} to {title}")
-    print(f"Result: {result.modified_count}")
-    print(f"Result: {result}")
-    return result.modified_count > 0
+    return True
 
 
 def delete_transcript(user_id, transcript_id):
@@ -258,4 +353,29 @@ def get_transcript(transcript_id, user_id=None):
     if user_id:
         query['user_id'] = user_id  # Add user check if user_id provided
 
-    return transcripts_collection.find_one(query)
+    return transcripts_collection.find_one(query, WITHOUT_RETRIEVAL_INDEX)
+
+
+def save_transcript_index(user_id, transcript_id, index):
+    """Store the retrieval index (chunks and embeddings) on a transcript"""
+    result = transcripts_collection.update_one(
+        {
+            'user_id': user_id,
+            'transcript_id': transcript_id
+        },
+        {
+            '$set': {
+                'retrieval': index
+            }
+        }
+    )
+    return result.modified_count > 0
+
+
+def get_transcript_index(user_id, transcript_id):
+    """Return the retrieval index of a transcript, or None if it has not been built"""
+    doc = transcripts_collection.find_one(
+        {'user_id': user_id, 'transcript_id': transcript_id},
+        {'retrieval': 1, '_id': 0}
+    )
+    return doc.get('retrieval') if doc else None